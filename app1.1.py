@@ -1,10 +1,38 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, url_for, Response
+from werkzeug.exceptions import RequestEntityTooLarge
 import pandas as pd
+import gzip
+import json
+import math
 import os
+import time
+import logging
 
-from  interactive2  import load_data, data_preprocessing, fairlearn_analysis
+from  interactive2  import (load_data, data_preprocessing, fairlearn_analysis, multi_attribute_analysis,
+                           analysis_columns, analysis_dtypes, can_stream, STREAM_CHUNKSIZE)
+from result_cache import ResultCache, make_key
+from artifact_store import ArtifactStore
+from uploads import configure_uploads, upload_hash, upload_source
+from job_queue import JobQueue, QueueFull
+from instrumentation import configure_logging, profile, stage, stage_metrics
 
+configure_logging()
+logger = logging.getLogger(__name__)
 app = Flask(__name__)
+# 上传边到达边落盘并计算哈希，超过 FAIRNESS_MAX_UPLOAD_MB 时直接返回 413
+configure_uploads(app)
+result_cache = ResultCache()
+# 训练过的模型与预测值，各 worker 共享；只换敏感特征或指标设置的请求不再训练
+artifact_store = ArtifactStore()
+# 每个请求训练模型可用的核心数；多个 gunicorn worker 并存时按 worker 数分配，避免超额占用
+MODEL_N_JOBS = int(os.environ['FAIRNESS_N_JOBS']) if os.environ.get('FAIRNESS_N_JOBS') else None
+job_queue = JobQueue()
+# 置信区间重采样次数上限，防止单个请求占满 CPU
+MAX_BOOTSTRAP = int(os.environ.get('FAIRNESS_MAX_BOOTSTRAP', 20000))
+# JSON 接口的响应超过该大小且客户端接受 gzip 时压缩
+GZIP_MIN_BYTES = int(os.environ.get('FAIRNESS_GZIP_MIN_BYTES', 1024))
+# JSON 接口的结构版本，字段有不兼容变化时递增
+API_SCHEMA_VERSION = 1
 
 
 @app.route('/')
@@ -38,19 +66,51 @@ def home():
                     <select name="file_type" style="width:150px; padding:5px;" required>
                         <option value="csv" selected>CSV 文件 (.csv)</option>
                         <option value="excel">Excel 文件 (.xlsx)</option>
+                        <option value="parquet">Parquet 文件 (.parquet)</option>
+                        <option value="feather">Arrow/Feather 文件 (.feather, .arrow)</option>
                     </select>
+                    <input type="text" name="sheet_name" placeholder="Excel 工作表（可选，* 为全部）"
+                           style="width:230px; padding:5px;">
                 </div>
 
                 <h3> 2.设置分析参数</h3>
 
-                <label>敏感特征列名：</label><br>
+                <label>敏感特征列名（多个用逗号分隔，共用一次训练）：</label><br>
                 <input type="text" name="sensitive_feature" list="columns" 
                         placeholder="输入或选择" style="width:230px; padding:5px;" required>
                 <br><br>
 
+                <label><input type="checkbox" name="intersectional" value="1"> 多个敏感特征按交叉分组分析</label>
+                <label>最小分组样本数：</label>
+                <input type="number" name="min_group_size" min="1" placeholder="如：30" style="width:80px; padding:5px;">
+                <br><br>
+
+                <label>置信区间重采样次数（可选，留空不计算）：</label><br>
+                <input type="number" name="bootstrap" min="0" max="100000" placeholder="如：1000" style="width:230px; padding:5px;">
+                <br><br>
+
                 <label>目标变量列名：</label><br>
                 <input type="text" name="target_column" list="columns" 
                         placeholder="输入或选择" style="width:230px; padding:5px;" required>
+                <br><br>
+
+                <label>预测列名（可选，填写后进入模型评估模式，不训练模型）：</label><br>
+                <input type="text" name="prediction_column" list="columns"
+                        placeholder="如：y_pred" style="width:230px; padding:5px;">
+                <br><br>
+
+                <label>得分列名（可选）：</label><br>
+                <input type="text" name="score_column" list="columns"
+                        placeholder="如：y_score" style="width:230px; padding:5px;">
+
+                <br><br>
+
+                <label>模型：</label><br>
+                <select name="estimator" style="width:230px; padding:5px;">
+                    <option value="random_forest" selected>随机森林 (random_forest)</option>
+                    <option value="hist_gradient_boosting">直方图梯度提升 (hist_gradient_boosting)</option>
+                    <option value="logistic_regression">逻辑回归 (logistic_regression)</option>
+                </select>
 
                 <datalist id="columns">
                     <option value="gender">
@@ -68,6 +128,7 @@ def home():
 
                 <br><br>
                 <button type="submit">开始分析</button>
+                <button type="submit" formaction="/jobs">后台提交（大文件）</button>
             </form>
         </div>
     </body>
@@ -78,56 +139,374 @@ def home():
 def analyze():
     try:
         file_path = request.files['file']
-        file_type = request.form['file_type']
-        sensitive_feature = request.form['sensitive_feature']
-        target_column = request.form['target_column']
-        print(f"📁 收到文件: {file_path.filename}")
-        print(f"🔍 敏感特征: {sensitive_feature}")
-        print(f"🎯 目标变量: {target_column}")
-
-        df = load_data(file_path, file_type)
-        print(f"📊 数据读取成功，形状: {df.shape}")
-        print(f"📋 数据列名: {list(df.columns)}")
-
-        features = [col for col in df.columns if col not in [sensitive_feature, target_column]]
-        print(f"🎯 特征列: {features}")
-
-        print("🔄 开始数据预处理...")
-        df_clean, features_clean = data_preprocessing(df, features, sensitive_feature, target_column)
-
-        if df_clean is not None:
-            print("✅ 数据预处理成功")
-            print(f"🔄 开始公平性分析...")
-            results = fairlearn_analysis(df_clean, sensitive_feature, target_column, features_clean)
-            print("✅ 公平性分析完成")
-
-            # 生成网页报告
-            return f'''
-            <h1>公平性分析报告</h1>
-            <div style="background:#f5f5f5;padding:20px;border-radius:10px;">
-                <h2>模型性能</h2>
-                <p>准确率: {results.get("base_accuracy", "N/A")}</p >
-                <p>精确率：: {results.get("base_precision", "N/A")}</p >
-                <p>召回率: {results.get("base_recall", "N/A")}</p >
-
-                <h2>公平性指标</h2>
-                <p>统计均等差异: {results['fairness_metrics']['demographic_parity_diff']:.3f} （越接近0越公平）</p >
-                <p>均等几率差异: {results['fairness_metrics']['equalized_odds_diff']:.3f} （越接近0越公平）</p >
-
-                <h2>详细结果</h2>
-                <pre>{results['metrics'].by_group if 'metrics' in results else '详细结果暂不可用'}</pre>
-            </div>
-            <br>
-            <a href="/">返回首页</a >
-            '''
-        else:
-            print("❌ 数据预处理失败")
-            return "数据处理失败，请检查数据格式"
+        params = analysis_params(request.form)
+        logger.info("📁 收到文件: %s", file_path.filename)
+        logger.info("🔍 敏感特征: %s", params['sensitive_feature'])
+        logger.info("🎯 目标变量: %s", params['target_column'])
+
+        with profile() as request_profile, stage('analyze_request'):
+            start = time.perf_counter()
+            summary, cache_hit = analyze_upload(file_path, params)
+            if summary is None:
+                print("❌ 数据预处理失败")
+                return "数据处理失败，请检查数据格式"
+            if cache_hit:
+                cache_status = f"命中（{(time.perf_counter() - start) * 1000:.1f} ms）"
+            else:
+                cache_status = "未命中（已重新计算）"
+
+        return render_report(summary, cache_status, request_profile)
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
-        print(f"💥 分析过程中出现错误: {str(e)}")
-        import traceback
-        print(f"🔍 详细错误信息: {traceback.format_exc()}")
+        logger.exception("💥 分析过程中出现错误: %s", e)
         return f"分析过程中出现错误：{str(e)}"
 
+
+@app.route('/api/analyze', methods=['POST'])
+def analyze_api():
+    """与 /analyze 参数相同，返回紧凑的 JSON 指标（供程序调用，客户端接受 gzip 时压缩）"""
+    try:
+        upload = request.files['file']
+        params = analysis_params(request.form)
+    except KeyError as e:
+        return json_response({'error': f"缺少参数: {e.args[0]}"}, 400)
+    try:
+        with profile() as request_profile, stage('analyze_request'):
+            summary, cache_hit = analyze_upload(upload, params)
+    except Exception as e:
+        logger.exception("💥 分析过程中出现错误: %s", e)
+        return json_response({'error': str(e)}, 500)
+    if summary is None:
+        return json_response({'error': '数据处理失败，请检查数据格式'}, 422)
+    return api_response(summary, params, cache_hit, request_profile)
+
+
+def analyze_upload(upload, params):
+    """相同文件内容 + 相同参数直接取缓存的报告，否则执行分析并写入缓存；返回 (报告摘要, 是否命中缓存)"""
+    with stage('hash_upload'):
+        content_hash = upload_hash(upload)
+    cache_key = make_key(content_hash, params)
+    summary = result_cache.get(cache_key)
+    if summary is not None:
+        logger.info("⚡ 命中结果缓存")
+        return summary, True
+    # 已落盘的上传直接按路径解析；上传摘要同时作为 Excel 列式缓存的键，不再重新哈希
+    summary = run_analysis(upload_source(upload), content_hash=content_hash, **params)
+    if summary is not None:
+        result_cache.put(cache_key, summary)
+    return summary, False
+
+
+def analysis_params(form):
+    """从表单中取出分析参数（也作为缓存键的一部分）"""
+    return {
+        'file_type': form['file_type'],
+        'sheet_name': form.get('sheet_name', '').strip() or None,
+        'sensitive_feature': form['sensitive_feature'],
+        'target_column': form['target_column'],
+        'prediction_column': form.get('prediction_column', '').strip() or None,
+        'score_column': form.get('score_column', '').strip() or None,
+        'estimator': form.get('estimator', 'random_forest'),
+        'intersectional': form.get('intersectional') == '1',
+        'min_group_size': int(form['min_group_size']) if form.get('min_group_size', '').strip().isdigit() else None,
+        'bootstrap': min(int(form['bootstrap']), MAX_BOOTSTRAP) if form.get('bootstrap', '').strip().isdigit() else 0,
+    }
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """异步提交：保存上传文件后立即返回任务 ID，由后台线程池执行分析"""
+    file = request.files['file']
+    params = analysis_params(request.form)
+    content_hash = upload_hash(file)
+    cache_key = make_key(content_hash, params)
+    try:
+        # 缓存键与上传摘要只传给任务函数，不出现在公开的任务状态中
+        job_id = job_queue.submit(analyze_job, file, run_kwargs={'cache_key': cache_key, 'content_hash': content_hash},
+                                  **params)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    logger.info("📨 已提交后台任务: %s", job_id)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id),
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': '任务不存在'}), 404
+    status.pop('traceback', None)
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if status['status'] == 'failed':
+        return jsonify({'job_id': job_id, 'status': 'failed', 'error': status.get('error')}), 500
+    if status['status'] != 'finished':
+        return jsonify({'job_id': job_id, 'status': status['status']}), 202
+    result = job_queue.result(job_id)
+    if result is None:
+        return jsonify({'job_id': job_id, 'status': 'failed', 'error': '任务结果无法读取'}), 500
+    if request.args.get('format') == 'json':
+        return api_response(result['summary'], status.get('params', {}),
+                            result['cache_status'] == '命中', result.get('profile'))
+    return render_report(result['summary'], result['cache_status'], result.get('profile'))
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    message = f"上传文件超过大小上限（{app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB）"
+    if request.path.startswith(('/api/', '/jobs')):
+        return json_response({'error': message}, 413)
+    return message, 413
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """各阶段的累计次数与耗时分位数
+
+    统计只保存在当前进程内：gunicorn 多 worker 部署时每次请求只返回处理它的那个 worker 的数据，
+    响应中的 scope 与 pid 标明来源；需要全局视图时按 pid 分别采集后再汇总。
+    """
+    return jsonify({'scope': 'worker', 'pid': os.getpid(), 'stages': stage_metrics()})
+
+
+def analyze_job(data_path, cache_key, content_hash=None, **params):
+    """后台任务：先查结果缓存，未命中时执行完整分析并写入缓存"""
+    with profile() as job_profile, stage('analyze_job'):
+        summary = result_cache.get(cache_key)
+        if summary is not None:
+            cache_status = '命中'
+        else:
+            summary = run_analysis(data_path, content_hash=content_hash, **params)
+            if summary is None:
+                raise ValueError("数据处理失败，请检查数据格式")
+            result_cache.put(cache_key, summary)
+            cache_status = '未命中（已重新计算）'
+    return {'summary': summary, 'cache_status': cache_status, 'profile': job_profile}
+
+
+def run_analysis(file_path, file_type, sensitive_feature, target_column, prediction_column=None, score_column=None,
+                 estimator='random_forest', intersectional=False, min_group_size=None, bootstrap=0, sheet_name=None,
+                 content_hash=None):
+    """加载 -> 预处理 -> 公平性分析，返回可缓存的报告摘要；预处理失败时返回 None
+    content_hash 为上传内容的 sha256（已算好时传入，Excel 列式缓存直接使用）"""
+    # 逗号分隔的多个敏感特征：只训练一次，合并报告
+    sensitive_features = [col.strip() for col in sensitive_feature.split(',') if col.strip()]
+    if len(sensitive_features) == 1:
+        sensitive_feature = sensitive_features[0]
+    else:
+        sensitive_feature = sensitive_features
+
+    if prediction_column and can_stream(file_type, sensitive_feature):
+        # 单个敏感特征的评估分块读取并累加分组计数，worker 的内存占用与文件大小无关
+        logger.info("🧪 模型评估模式（分块流式），预测列: %s", prediction_column)
+        reader = load_data(file_path, file_type, chunksize=STREAM_CHUNKSIZE,
+                           columns=analysis_columns([], sensitive_feature, target_column, prediction_column))
+        results = fairlearn_analysis(reader, sensitive_feature, target_column, [], prediction_column,
+                                     min_group_size=min_group_size, bootstrap=bootstrap,
+                                     n_jobs=MODEL_N_JOBS) if reader is not None else None
+        if results is None:
+            return None
+        by_group = results['metrics'].by_group
+    else:
+        # Excel、交叉分组与训练模式整表载入
+        if prediction_column:
+            # 模型评估模式下所需列已知，只解析这些列
+            columns = analysis_columns([], sensitive_feature, target_column, prediction_column, score_column)
+            df = load_data(file_path, file_type, columns=columns, dtype=analysis_dtypes(score_column),
+                           sheet_name=sheet_name, content_hash=content_hash)
+        else:
+            df = load_data(file_path, file_type, sheet_name=sheet_name, content_hash=content_hash)
+        logger.info("📊 数据读取成功，形状: %s", df.shape)
+        logger.debug("📋 数据列名: %s", list(df.columns))
+
+        if prediction_column:
+            # 模型评估模式：直接使用已有预测列，不需要特征列
+            logger.info("🧪 模型评估模式，预测列: %s", prediction_column)
+            features = []
+        else:
+            excluded = sensitive_features + [target_column, score_column]
+            features = [col for col in df.columns if col not in excluded]
+        logger.debug("🎯 特征列: %s", features)
+
+        logger.info("🔄 开始数据预处理...")
+        df_clean, features_clean = data_preprocessing(df, features, sensitive_feature, target_column,
+                                                      prediction_column, score_column)
+        if df_clean is None:
+            return None
+
+        logger.info("✅ 数据预处理成功")
+        logger.info("🔄 开始公平性分析...")
+        if isinstance(sensitive_feature, list) and not intersectional:
+            results = multi_attribute_analysis(df_clean, sensitive_feature, target_column, features_clean,
+                                               prediction_column, estimator=estimator, n_jobs=MODEL_N_JOBS,
+                                               artifacts=artifact_store, bootstrap=bootstrap)
+            by_group = results['by_group']
+        else:
+            # 单个敏感特征，或多个敏感特征的交叉分组
+            results = fairlearn_analysis(df_clean, sensitive_feature, target_column, features_clean,
+                                         prediction_column, score_column, estimator=estimator, n_jobs=MODEL_N_JOBS,
+                                         min_group_size=min_group_size, bootstrap=bootstrap, artifacts=artifact_store)
+            by_group = results['metrics'].by_group if 'metrics' in results else '详细结果暂不可用'
+    logger.info("✅ 公平性分析完成")
+
+    summary = {
+        'mode': f"模型评估（预测列: {prediction_column}）" if prediction_column else f"训练演示模型（{estimator}）",
+        'base_accuracy': results.get("base_accuracy", "N/A"),
+        'base_precision': results.get("base_precision", "N/A"),
+        'base_recall': results.get("base_recall", "N/A"),
+        'fairness_metrics': results['fairness_metrics'],
+        'fairness_summary': results.get('fairness_summary'),
+        'fairness_ci': results.get('fairness_ci'),
+        'by_group': by_group,
+    }
+    # JSON 接口的指标在分析时转换一次，随报告一起缓存，响应时不再转换 DataFrame
+    summary['payload'] = summary_payload(summary, prediction_column, estimator)
+    return summary
+
+
+def _number(value):
+    # NaN / 非数值（如 "N/A"）在 JSON 中记为 null
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _table_payload(table):
+    """DataFrame -> {'columns': [...], 'data': [[...], ...]}，分组标签展开为普通列"""
+    if not isinstance(table, pd.DataFrame):
+        return None
+    return json.loads(table.reset_index().to_json(orient='split', index=False, force_ascii=False))
+
+
+def _interval_payload(ci):
+    return {key: [_number(v) for v in ci[key]] for key in ('demographic_parity_diff', 'equalized_odds_diff')}
+
+
+def _ci_payload(fairness_ci):
+    """置信区间 -> JSON；多个敏感特征时整体差异取最大值，没有单一区间，只按敏感特征列出"""
+    if not fairness_ci:
+        return None
+    payload = {'confidence': fairness_ci['confidence'], 'n_resamples': fairness_ci['n_resamples']}
+    if 'by_attribute' in fairness_ci:
+        payload.update({'demographic_parity_diff': None, 'equalized_odds_diff': None,
+                        'by_attribute': {name: _interval_payload(ci) for name, ci in fairness_ci['by_attribute'].items()}})
+    else:
+        payload.update(_interval_payload(fairness_ci))
+    return payload
+
+
+def summary_payload(summary, prediction_column=None, estimator=None):
+    """报告摘要 -> JSON 接口的结构（只含 Python 基本类型）"""
+    return {
+        'schema_version': API_SCHEMA_VERSION,
+        'mode': 'evaluate' if prediction_column else 'train',
+        'estimator': None if prediction_column else estimator,
+        'overall': {
+            'accuracy': _number(summary['base_accuracy']),
+            'precision': _number(summary['base_precision']),
+            'recall': _number(summary['base_recall']),
+        },
+        'fairness': {
+            'demographic_parity_diff': _number(summary['fairness_metrics']['demographic_parity_diff']),
+            'equalized_odds_diff': _number(summary['fairness_metrics']['equalized_odds_diff']),
+            'ci': _ci_payload(summary.get('fairness_ci')),
+            'by_attribute': _table_payload(summary.get('fairness_summary')),
+        },
+        'groups': _table_payload(summary['by_group']),
+    }
+
+
+def json_response(payload, status=200):
+    """紧凑 JSON（无多余空白）；响应较大且客户端接受 gzip 时压缩"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def api_response(summary, params, cache_hit, run_profile=None):
+    payload = summary.get('payload') or summary_payload(summary, params.get('prediction_column'),
+                                                        params.get('estimator'))
+    timings = {}
+    for record in run_profile.stages if run_profile is not None else []:
+        timings[record['stage']] = round(timings.get(record['stage'], 0) + record['wall_ms'], 3)
+    return json_response(dict(payload, cache='hit' if cache_hit else 'miss', timings_ms=timings))
+
+
+def render_fairness_summary(fairness_summary):
+    # 多敏感特征时逐个列出，上面的两项为其中的最大差异
+    if fairness_summary is None:
+        return ''
+    return f"<p>多个敏感特征时以上为最大差异，各特征如下：</p ><pre>{fairness_summary.round(3)}</pre>"
+
+
+def render_fairness_ci(fairness_ci):
+    # 自助法置信区间（未计算时不显示）
+    if not fairness_ci:
+        return ''
+
+    def interval(ci):
+        dp_low, dp_high = ci['demographic_parity_diff']
+        eo_low, eo_high = ci['equalized_odds_diff']
+        return f"统计均等差异 [{dp_low:.3f}, {dp_high:.3f}]，均等几率差异 [{eo_low:.3f}, {eo_high:.3f}]"
+
+    title = f"95% 置信区间（自助法 {fairness_ci['n_resamples']} 次重采样）"
+    if 'by_attribute' in fairness_ci:
+        # 多个敏感特征时逐个列出
+        rows = ''.join(f"<li>{name}: {interval(ci)}</li>" for name, ci in fairness_ci['by_attribute'].items())
+        return f"<p>{title}：</p ><ul>{rows}</ul>"
+    return f"<p>{title}：{interval(fairness_ci)}</p >"
+
+
+def render_profile(run_profile):
+    # 本次请求各阶段的耗时与内存
+    if run_profile is None:
+        return ''
+    return f"<h2>各阶段耗时与内存</h2><pre>{run_profile}</pre>"
+
+
+def render_report(summary, cache_status, run_profile=None):
+    # 生成网页报告
+    return f'''
+    <h1>公平性分析报告</h1>
+    <div style="background:#f5f5f5;padding:20px;border-radius:10px;">
+        <p>分析模式: {summary['mode']}</p >
+        <p>结果缓存: {cache_status}</p >
+        <h2>模型性能</h2>
+        <p>准确率: {summary['base_accuracy']}</p >
+        <p>精确率：: {summary['base_precision']}</p >
+        <p>召回率: {summary['base_recall']}</p >
+
+        <h2>公平性指标</h2>
+        <p>统计均等差异: {summary['fairness_metrics']['demographic_parity_diff']:.3f} （越接近0越公平）</p >
+        <p>均等几率差异: {summary['fairness_metrics']['equalized_odds_diff']:.3f} （越接近0越公平）</p >
+        {render_fairness_ci(summary.get('fairness_ci'))}
+        {render_fairness_summary(summary.get('fairness_summary'))}
+
+        <h2>详细结果</h2>
+        <pre>{summary['by_group']}</pre>
+        {render_profile(run_profile)}
+    </div>
+    <br>
+    <a href="/">返回首页</a >
+    '''
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
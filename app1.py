@@ -3,8 +3,10 @@ import pandas as pd
 import os
 
 from interactive1 import load_data,data_preprocessing,fairlearn_analysis
+from uploads import configure_uploads, upload_source
 
 app = Flask(__name__)
+configure_uploads(app)
 @app.route('/')
 def home():
     return '''
@@ -46,7 +48,8 @@ def analyze():
         print(f"🔍 敏感特征: {sensitive_feature}")
         print(f"🎯 目标变量: {target_column}")
 
-        df = pd.read_csv(file)
+        source = upload_source(file)
+        df = pd.read_csv(source, memory_map=isinstance(source, str))
         print(f"📊 数据读取成功，形状: {df.shape}")
         print(f"📋 数据列名: {list(df.columns)}")
 
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from result_cache import make_key
+from storage import default_dir, evict_lru, private_dir
+
+DEFAULT_MAX_BYTES = int(os.environ.get('FAIRNESS_ARTIFACT_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+ARTIFACT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def frame_hash(df, columns):
+    """指定列的内容哈希（逐行哈希后再整体 sha256），与列以外的数据和行索引无关"""
+    row_hashes = pd.util.hash_pandas_object(df[list(columns)], index=False).to_numpy()
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+
+def model_key(df, features, target_column, estimator, random_state):
+    """模型键 = 训练数据（特征列 + 目标列）哈希 + 特征 + 目标 + 模型 + 随机种子；与敏感特征和指标设置无关"""
+    content_hash = frame_hash(df, list(features) + [target_column])
+    return make_key(content_hash, {
+        'version': ARTIFACT_VERSION,
+        'features': list(features),
+        'target': target_column,
+        'estimator': estimator if isinstance(estimator, str) else repr(estimator),
+        'random_state': random_state,
+    })
+
+
+class ArtifactStore:
+    """磁盘上的模型与预测存储：每个键一个目录，模型用 joblib 保存，预测值保存为 .npy（读取时内存映射）
+
+    写入时先写临时目录再原子重命名，多进程同时训练同一个模型时只保留先完成的一份；
+    按目录的最近访问时间淘汰，总大小不超过 max_bytes。
+    同一用户的所有进程（命令行、gunicorn worker、批量扫描）共用一个目录：默认为 FAIRNESS_ARTIFACT_DIR
+    或临时目录下按用户区分的子目录，权限为 0700（模型以 joblib/pickle 保存，载入时会执行其中的代码）。
+    """
+
+    def __init__(self, artifact_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.artifact_dir = private_dir(artifact_dir or default_dir('FAIRNESS_ARTIFACT_DIR', 'ai-fairness-artifacts'))
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.artifact_dir, key)
+
+    def get(self, key):
+        """返回 {'model', 'y_pred', 其余数组..., 'meta'}；不存在或无法读取时返回 None"""
+        import joblib
+
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            # 模型中的大数组与预测值都以内存映射方式打开，不整体读入内存
+            artifacts = {'model': joblib.load(os.path.join(path, 'model.joblib'), mmap_mode='r'), 'meta': meta}
+            for name in meta['arrays']:
+                artifacts[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 写坏的条目或类已改名的旧模型都按未命中处理，删除后重新训练
+            logger.warning("模型目录条目无法读取，已删除: %s", path, exc_info=True)
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        # 以修改时间记录最近访问，供淘汰使用
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # 刚被其他进程淘汰
+        return artifacts
+
+    def put(self, key, model, meta=None, **arrays):
+        """保存模型与预测数组（如 y_pred=..., y_score=...）；meta 为可 JSON 序列化的附加信息"""
+        import joblib
+
+        tmp_path = tempfile.mkdtemp(dir=self.artifact_dir, suffix='.tmp')
+        try:
+            joblib.dump(model, os.path.join(tmp_path, 'model.joblib'))
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_path, f'{name}.npy'), np.asarray(values))
+            with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(dict(meta or {}, arrays=list(arrays)), f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            # 其他进程已写入同一个键（目标目录非空），保留已有的一份
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+
+    @staticmethod
+    def _size(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+    def evict(self):
+        """删除最久未访问的条目，直到总大小回到上限以内"""
+        evict_lru(self.artifact_dir, self.max_bytes,
+                  lambda entry: entry.is_dir() and not entry.name.endswith('.tmp'),
+                  size=self._size, remove=lambda path: shutil.rmtree(path, ignore_errors=True))
+
+    def clear(self):
+        for entry in os.scandir(self.artifact_dir):
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
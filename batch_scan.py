@@ -0,0 +1,225 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+# 清单中每个任务的字段；features / sensitive 可以是列表，也可以是用 ';' 分隔的字符串
+MANIFEST_FIELDS = ['file', 'file_type', 'sheet', 'features', 'sensitive', 'target', 'prediction', 'score',
+                   'estimator']
+SUMMARY_FIELDS = ['job', 'file', 'sensitive', 'target', 'features', 'prediction', 'estimator', 'status', 'error',
+                  'rows', 'groups', 'accuracy', 'demographic_parity_diff', 'equalized_odds_diff', 'seconds']
+FILE_TYPES = {'.csv': 'csv', '.xlsx': 'excel', '.xls': 'excel', '.parquet': 'parquet',
+              '.feather': 'feather', '.arrow': 'arrow'}
+
+# 已加载的数据，键为 (文件路径, 文件类型, 工作表)；fork 出的工作进程直接共享父进程中的这些 DataFrame（写时复制）
+_SHARED_FRAMES = {}
+
+
+def _as_list(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(';') if item.strip()]
+    return list(value)
+
+
+def read_manifest(path):
+    """读取任务清单：.json（任务列表）、.jsonl（每行一个任务）或 .csv（每行一个任务），返回规范化后的任务"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            entries = [json.loads(line) for line in f if line.strip()]
+        elif path.endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = list(csv.DictReader(f))
+
+    # 相对路径按清单所在目录解析
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for i, entry in enumerate(entries):
+        unknown = set(entry) - set(MANIFEST_FIELDS)
+        if unknown:
+            raise ValueError(f"清单第 {i + 1} 项包含未知字段: {sorted(unknown)}")
+        if not entry.get('file') or not entry.get('sensitive') or not entry.get('target'):
+            raise ValueError(f"清单第 {i + 1} 项缺少 file / sensitive / target")
+        file_path = os.path.join(base_dir, entry['file'])
+        file_type = entry.get('file_type') or FILE_TYPES.get(os.path.splitext(file_path)[1].lower(), 'csv')
+        sensitive = _as_list(entry['sensitive'])
+        jobs.append({
+            'job': i,
+            'file': file_path,
+            'file_type': file_type,
+            'sheet': entry.get('sheet') or None,
+            'features': _as_list(entry.get('features')),
+            # 多个敏感特征按交叉分组分析
+            'sensitive': sensitive[0] if len(sensitive) == 1 else sensitive,
+            'target': entry['target'],
+            'prediction': entry.get('prediction') or None,
+            'score': entry.get('score') or None,
+            'estimator': entry.get('estimator') or None,
+        })
+    return jobs
+
+
+def data_source(job):
+    """任务读取的数据：同一文件的不同 Excel 工作表视为不同的数据"""
+    return job['file'], job['file_type'], job['sheet']
+
+
+def file_columns(jobs):
+    """每个文件只加载一次：读取该文件上所有任务用到的列的并集
+
+    文件中不存在的列不参与加载，只让引用它的任务在预处理时失败，不影响同一文件上的其他任务。
+    """
+    from interactive2 import analysis_columns, read_columns
+
+    columns = {}
+    for job in jobs:
+        needed = analysis_columns(job['features'], job['sensitive'], job['target'], job['prediction'], job['score'])
+        columns.setdefault(data_source(job), {}).update(dict.fromkeys(needed))
+
+    projected = {}
+    for source, cols in columns.items():
+        try:
+            available = set(read_columns(*source))
+        except Exception:
+            # 读不到表头时按原样加载，由 load_data 报告错误
+            available = cols
+        projected[source] = [col for col in cols if col in available]
+    return projected
+
+
+def _frame(job, columns):
+    """取任务对应的数据：fork 模式下由父进程预先加载，否则每个工作进程第一次用到时加载并缓存"""
+    from interactive2 import load_data
+
+    source = data_source(job)
+    if source not in _SHARED_FRAMES:
+        file_path, file_type, sheet = source
+        _SHARED_FRAMES[source] = load_data(file_path, file_type, columns=columns, sheet_name=sheet)
+    return _SHARED_FRAMES[source]
+
+
+def run_job(job, columns, default_estimator):
+    """在工作进程中执行一个任务，返回汇总记录；分析过程的输出不打印"""
+    from artifact_store import ArtifactStore
+    from interactive2 import data_preprocessing, fairlearn_analysis
+
+    estimator = job['estimator'] or default_estimator
+    record = {
+        'job': job['job'],
+        'file': job['file'],
+        'sensitive': job['sensitive'] if isinstance(job['sensitive'], str) else ';'.join(job['sensitive']),
+        'target': job['target'],
+        'features': ';'.join(job['features']),
+        'prediction': job['prediction'],
+        'estimator': None if job['prediction'] else estimator,
+        'status': 'error',
+    }
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = _frame(job, columns)
+            if df is None:
+                raise ValueError("数据加载失败")
+            df_clean, features = data_preprocessing(df, job['features'], job['sensitive'], job['target'],
+                                                    job['prediction'], job['score'])
+            if df_clean is None:
+                raise ValueError("预处理失败（列不存在或清理后没有数据）")
+            # 任务之间多进程并行，模型单核训练（见 parallel.resolve_n_jobs）；同一份训练数据只换敏感特征的任务复用已保存的模型
+            results = fairlearn_analysis(df_clean, job['sensitive'], job['target'], features,
+                                         prediction_column=job['prediction'], score_column=job['score'],
+                                         estimator=estimator, n_jobs=1, artifacts=ArtifactStore())
+        metrics = results['metrics']
+        record.update({
+            'status': 'ok',
+            'rows': len(df_clean),
+            'groups': len(metrics.labels),
+            'accuracy': float(results['base_accuracy']),
+            'demographic_parity_diff': results['fairness_metrics']['demographic_parity_diff'],
+            'equalized_odds_diff': results['fairness_metrics']['equalized_odds_diff'],
+            'by_group': json.loads(metrics.by_group.reset_index().to_json(orient='records', force_ascii=False)),
+        })
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        record['traceback'] = traceback.format_exc()
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(jobs, workers=None, default_estimator='random_forest'):
+    """用进程池执行全部任务，按清单顺序返回汇总记录
+
+    支持 fork 的平台上，父进程先把每个文件加载一次，工作进程直接共享；
+    否则每个工作进程按需加载并缓存自己用到的文件。
+    """
+    from interactive2 import load_data
+
+    columns = file_columns(jobs)
+    workers = workers or os.cpu_count()
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    if fork:
+        for source, cols in columns.items():
+            file_path, file_type, sheet = source
+            print(f"📂 加载 {file_path}{f' [{sheet}]' if sheet else ''}（{len(cols)} 列）")
+            with contextlib.redirect_stdout(io.StringIO()):
+                _SHARED_FRAMES[source] = load_data(file_path, file_type, columns=cols, sheet_name=sheet)
+
+    context = multiprocessing.get_context('fork' if fork else None)
+    records = []
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)) or 1, mp_context=context) as executor:
+            futures = [executor.submit(run_job, job, columns[data_source(job)], default_estimator) for job in jobs]
+            for future in futures:
+                record = future.result()
+                mark = '✅' if record['status'] == 'ok' else '❌'
+                print(f"{mark} [{record['job']}] {os.path.basename(record['file'])} "
+                      f"{record['sensitive']} -> {record['target']} ({record['seconds']:.1f}s)"
+                      + (f" {record['error']}" if record['status'] != 'ok' else ''))
+                records.append(record)
+    finally:
+        _SHARED_FRAMES.clear()
+    return records
+
+
+def write_summary(records, output):
+    """.csv 输出每个任务一行的汇总；其他扩展名输出 JSON，包含每个任务的分组指标"""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    if output.endswith('.csv'):
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按任务清单批量扫描多个数据集 / 敏感特征 / 目标列，结果写入一个汇总文件")
+    parser.add_argument('manifest', help="任务清单（.json / .jsonl / .csv），字段: " + ', '.join(MANIFEST_FIELDS))
+    parser.add_argument('--output', default='batch_results.json', help="汇总文件（.json 或 .csv）")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数（默认 CPU 核心数）")
+    parser.add_argument('--estimator', default='random_forest', help="清单未指定模型时使用的模型")
+    args = parser.parse_args()
+
+    jobs = read_manifest(args.manifest)
+    print(f"📋 共 {len(jobs)} 个任务，涉及 {len({job['file'] for job in jobs})} 个文件")
+    start = time.perf_counter()
+    records = run_batch(jobs, workers=args.workers, default_estimator=args.estimator)
+    write_summary(records, args.output)
+    failed = sum(record['status'] != 'ok' for record in records)
+    print(f"\n✅ 完成 {len(records) - failed} 个，失败 {failed} 个，共 {time.perf_counter() - start:.1f}s")
+    print(f"结果已写入 {args.output}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
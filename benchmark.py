@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# 默认从 1 万行测到 5000 万行；训练与网页路由只在较小规模上测量
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000, 50_000_000]
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'ai-fairness-bench')
+PACKAGES = ['numpy', 'pandas', 'sklearn', 'pyarrow', 'flask']
+
+
+def git_commit():
+    """当前提交号；工作区有未提交修改时加上 -dirty"""
+    try:
+        root = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def package_versions():
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            versions[name] = None
+    return versions
+
+
+def dataset_path(data_dir, n_rows, params):
+    """按行数与生成参数命名数据文件，相同配置只生成一次"""
+    name = (f"loan-{n_rows}-f{params['n_features']}-g{params['n_groups']}"
+            f"-i{params['imbalance']}-m{params['missing_rate']}.csv")
+    return os.path.join(data_dir, name)
+
+
+def ensure_dataset(data_dir, n_rows, params):
+    from synthetic_data import write_synthetic_csv
+
+    os.makedirs(data_dir, exist_ok=True)
+    path = dataset_path(data_dir, n_rows, params)
+    if not os.path.exists(path):
+        print(f"🧪 生成 {n_rows} 行合成数据: {path}")
+        tmp_path = f"{path}.tmp"
+        write_synthetic_csv(tmp_path, n_rows, with_predictions=True, **params)
+        os.replace(tmp_path, path)
+    return path
+
+
+def post_analyze(client, path, form):
+    with open(path, 'rb') as f:
+        data = dict(form, file=(f, os.path.basename(path)))
+        response = client.post('/analyze', data=data, content_type='multipart/form-data')
+    if response.status_code != 200:
+        raise RuntimeError(f"/analyze 返回 {response.status_code}")
+
+
+def measure(records, n_rows, step, func, *args, **kwargs):
+    """测量一个步骤；步骤内部记录的阶段以 "步骤/阶段" 命名，便于跨提交逐项对比"""
+    from instrumentation import profile, stage
+
+    with profile() as step_profile:
+        with stage(step):
+            result = func(*args, **kwargs)
+    for record in step_profile.stages:
+        name = record['stage'] if record['stage'] == step else f"{step}/{record['stage']}"
+        records.append(dict(record, stage=name, rows=n_rows))
+    return result
+
+
+def run_size(path, n_rows, features, max_train_rows, max_route_rows, estimator):
+    """在当前进程中对一个规模依次测量各步骤，返回各阶段记录"""
+    from interactive2 import data_preprocessing, fairlearn_analysis, load_data, warm_imports
+
+    # 训练所需的模块先导入，不计入训练耗时
+    warm_imports()
+    records = []
+    df = measure(records, n_rows, 'load_data', load_data, path, 'csv')
+    df_clean, features_clean = measure(records, n_rows, 'data_preprocessing', data_preprocessing,
+                                       df, features, 'gender', 'loan_approved', 'y_pred')
+    del df
+    measure(records, n_rows, 'fairlearn_analysis.evaluate', fairlearn_analysis,
+            df_clean, 'gender', 'loan_approved', [], prediction_column='y_pred')
+    if n_rows <= max_train_rows:
+        measure(records, n_rows, 'fairlearn_analysis.train', fairlearn_analysis,
+                df_clean, 'gender', 'loan_approved', features_clean, estimator=estimator)
+    del df_clean
+
+    if n_rows <= max_route_rows:
+        # 每次使用空的结果缓存与模型目录，测到的是完整分析（含训练），而不是缓存命中或载入已保存的模型；
+        # 模型目录在 app1.1 导入时创建，必须先设置环境变量
+        scratch = tempfile.mkdtemp(prefix='bench-cache-')
+        os.environ['FAIRNESS_CACHE_DIR'] = os.path.join(scratch, 'results')
+        os.environ['FAIRNESS_ARTIFACT_DIR'] = os.path.join(scratch, 'artifacts')
+        try:
+            spec = importlib.util.spec_from_file_location(
+                'app11', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app1.1.py'))
+            app11 = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(app11)
+            client = app11.app.test_client()
+            measure(records, n_rows, 'route.analyze.evaluate', post_analyze, client, path,
+                    {'file_type': 'csv', 'sensitive_feature': 'gender', 'target_column': 'loan_approved',
+                     'prediction_column': 'y_pred'})
+            if n_rows <= max_train_rows:
+                measure(records, n_rows, 'route.analyze.train', post_analyze, client, path,
+                        {'file_type': 'csv', 'sensitive_feature': 'gender', 'target_column': 'loan_approved',
+                         'estimator': estimator})
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return records
+
+
+def worker(args):
+    """子进程入口：每个规模在独立进程中运行，内存峰值互不影响；结果写入 --result-file"""
+    from synthetic_data import feature_names
+
+    # 分析过程的输出不计入结果，也不刷屏
+    os.environ.setdefault('FAIRNESS_LOG_LEVEL', 'WARNING')
+    with contextlib.redirect_stdout(io.StringIO()):
+        records = run_size(args.data_path, args.rows, feature_names(args.n_features),
+                           args.max_train_rows, args.max_route_rows, args.estimator)
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+
+
+def compare(results, baseline_path):
+    """与另一次提交的结果逐项对比墙钟时间"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    base = {(r['rows'], r['stage']): r['wall_ms'] for r in baseline['results']}
+    print(f"\n📊 对比基线 {baseline.get('git_commit')}（比值 < 1 表示更快）:")
+    for record in results:
+        key = (record['rows'], record['stage'])
+        if key in base and base[key] > 0:
+            print(f"  {record['rows']:>10} {record['stage']:<48} {base[key]:>10.1f} ms -> "
+                  f"{record['wall_ms']:>10.1f} ms  ({record['wall_ms'] / base[key]:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在不同数据规模上测量加载、预处理、分析和 /analyze 路由的耗时")
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_SIZES), help="逗号分隔的行数")
+    parser.add_argument('--n-features', type=int, default=5)
+    parser.add_argument('--n-groups', type=int, default=3)
+    parser.add_argument('--imbalance', type=float, default=1.0)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--estimator', default='hist_gradient_boosting')
+    parser.add_argument('--max-train-rows', type=int, default=1_000_000, help="超过该行数时跳过模型训练")
+    parser.add_argument('--max-route-rows', type=int, default=1_000_000, help="超过该行数时跳过 /analyze 路由")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--output', default=None, help="结果 JSON 路径（默认 benchmark_results/<提交号>.json）")
+    parser.add_argument('--compare', default=None, help="与之前的结果 JSON 对比")
+    # 以下参数供子进程使用
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--data-path', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    params = {'n_features': args.n_features, 'n_groups': args.n_groups,
+              'imbalance': args.imbalance, 'missing_rate': args.missing_rate}
+    results = []
+    for n_rows in [int(n) for n in args.sizes.split(',') if n.strip()]:
+        path = ensure_dataset(args.data_dir, n_rows, params)
+        fd, result_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', '--rows', str(n_rows),
+                        '--data-path', path, '--result-file', result_file,
+                        '--n-features', str(args.n_features), '--estimator', args.estimator,
+                        '--max-train-rows', str(args.max_train_rows),
+                        '--max-route-rows', str(args.max_route_rows)], check=True)
+        with open(result_file, encoding='utf-8') as f:
+            records = json.load(f)
+        os.remove(result_file)
+        print(f"⏱️ {n_rows} 行: 共 {time.perf_counter() - start:.1f} s")
+        for record in records:
+            if '/' not in record['stage']:
+                peak = f"{record['peak_rss_mb']:.0f} MB" if record['peak_rss_mb'] is not None else 'N/A'
+                print(f"  {record['stage']:<36} {record['wall_ms']:>10.1f} ms  峰值内存 {peak}")
+        results.extend(records)
+
+    commit = git_commit()
+    output = args.output or os.path.join('benchmark_results', f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'git_commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'packages': package_versions(),
+            'params': dict(params, estimator=args.estimator, max_train_rows=args.max_train_rows,
+                           max_route_rows=args.max_route_rows),
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已写入 {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from group_metrics import rates_from_counts
+from parallel import resolve_n_jobs
+
+# 每个重采样块的计数数组 (块大小, 分组数, 4) 不超过该内存预算；
+# 块大小只由分组数决定，块与随机种子一一对应，结果与进程数无关
+CHUNK_BYTES = int(float(os.environ.get('FAIRNESS_BOOTSTRAP_CHUNK_MB', 64)) * 1024 * 1024)
+
+
+def resamples_per_chunk(n_groups, chunk_bytes=None):
+    """按内存预算确定每块的重采样次数：预算 / (分组数 × 4 个 int64 计数)"""
+    chunk_bytes = CHUNK_BYTES if chunk_bytes is None else chunk_bytes
+    return max(1, chunk_bytes // (max(n_groups, 1) * 4 * np.dtype(np.int64).itemsize))
+
+
+def resample_counts(counts, n_resamples, seed):
+    """批量自助重采样，返回形状为 (n_resamples, n_groups, 4) 的分组计数
+
+    有放回地抽取 n 行后，各 (分组, 结果) 桶的行数服从以经验频率为参数的多项分布，
+    因此直接按多项分布抽取计数，与抽取索引矩阵再 bincount 的分布完全相同，但与行数 n 无关。
+    """
+    counts = np.asarray(counts)
+    flat = counts.reshape(-1)
+    n = flat.sum()
+    rng = np.random.default_rng(seed)
+    samples = rng.multinomial(n, flat / n, size=n_resamples)
+    return samples.reshape((n_resamples,) + counts.shape)
+
+
+def disparity_arrays(counts):
+    """对一批计数同时计算 DP / EO 差异；某次重采样中未出现的分组不参与比较"""
+    rates = rates_from_counts(counts)
+    present = rates['count'] > 0
+
+    def spread(values):
+        values = np.where(present, values, np.nan)
+        return np.nanmax(values, axis=-1) - np.nanmin(values, axis=-1)
+
+    dp = spread(rates['selection_rate'])
+    eo = np.maximum(spread(rates['recall']), spread(rates['false_positive_rate']))
+    return dp, eo
+
+
+def _bootstrap_chunk(counts, n_resamples, seed):
+    return disparity_arrays(resample_counts(counts, n_resamples, seed))
+
+
+def bootstrap_fairness_ci(counts, n_resamples=1000, confidence=0.95, random_state=42, n_jobs=None):
+    """DP / EO 差异的自助法百分位置信区间；counts 为每组的 TN/FP/FN/TP 计数
+
+    重采样次数较多且 n_jobs > 1 时，各块分发到进程池并行计算。
+    """
+    counts = np.asarray(counts)
+    per_chunk = resamples_per_chunk(len(counts))
+    chunk_sizes = [min(per_chunk, n_resamples - start) for start in range(0, n_resamples, per_chunk)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(chunk_sizes))
+
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs > 1 and len(chunk_sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunk_sizes))) as executor:
+            parts = list(executor.map(_bootstrap_chunk, [counts] * len(chunk_sizes), chunk_sizes, seeds))
+    else:
+        parts = [_bootstrap_chunk(counts, size, seed) for size, seed in zip(chunk_sizes, seeds)]
+
+    dp = np.concatenate([part[0] for part in parts])
+    eo = np.concatenate([part[1] for part in parts])
+    alpha = (1 - confidence) / 2 * 100
+    return {
+        'demographic_parity_diff': tuple(np.nanpercentile(dp, [alpha, 100 - alpha]).tolist()),
+        'equalized_odds_diff': tuple(np.nanpercentile(eo, [alpha, 100 - alpha]).tolist()),
+        'n_resamples': n_resamples,
+        'confidence': confidence,
+    }
@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from bootstrap_ci import disparity_arrays
+from group_metrics import GroupMetrics, confusion_counts, factorize_sensitive, rates_from_counts
+from parallel import resolve_n_jobs
+
+SPREAD_METRICS = ['accuracy', 'recall', 'false_positive_rate', 'selection_rate']
+
+
+def _fit_fold(estimator, X, y, train_idx, test_idx):
+    """训练一折并预测该折的验证行（在工作进程中执行）；X / y 为整表数组，只按行号取子集"""
+    from sklearn.base import clone
+
+    start = time.perf_counter()
+    model = clone(estimator).fit(X[train_idx], y[train_idx])
+    return model.predict(X[test_idx]), time.perf_counter() - start
+
+
+def cross_validated_predictions(estimator, X, y, n_splits=5, n_jobs=None, random_state=42):
+    """分层 k 折交叉验证：各折分发到多个进程并行训练，每一行都由没有见过它的模型预测
+
+    X / y 只转换一次为数组，joblib 把大数组以内存映射方式共享给工作进程，各折只传递行号，不复制 DataFrame；
+    estimator 为未训练的单核基础模型（见 parallel.resolve_n_jobs）。
+    返回 (样本外预测值, 每行所属的折编号, 各折训练耗时)。
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import StratifiedKFold
+
+    n_jobs = resolve_n_jobs(n_jobs)
+    X_values = X.to_numpy() if isinstance(X, pd.DataFrame) else np.asarray(X)
+    y_values = np.asarray(y)
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+                 .split(np.zeros(len(y_values)), y_values))
+
+    outputs = Parallel(n_jobs=min(n_jobs, n_splits))(
+        delayed(_fit_fold)(estimator, X_values, y_values, train_idx, test_idx) for train_idx, test_idx in folds)
+
+    y_pred = np.empty(len(y_values), dtype=outputs[0][0].dtype)
+    fold_ids = np.empty(len(y_values), dtype=np.int64)
+    for fold, ((_, test_idx), (fold_pred, _)) in enumerate(zip(folds, outputs)):
+        y_pred[test_idx] = fold_pred
+        fold_ids[test_idx] = fold
+    return y_pred, fold_ids, [seconds for _, seconds in outputs]
+
+
+def cross_validation_summary(y_true, y_pred, fold_ids, sensitive_features, n_splits, min_group_size=None,
+                             pos_label=1):
+    """各折与汇总的分组指标：一次 bincount 得到形状为 (n_splits, n_groups, 4) 的计数
+    min_group_size 给定时，汇总样本数不足的分组不参与各折的差异与波动统计（汇总结果仍保留全部分组）
+
+    返回 pooled（所有样本外预测汇总的 GroupMetrics）、folds（每折的准确率与 DP / EO 差异）
+    以及 group_spread（各组比率在各折之间的均值、标准差与极值）。
+    """
+    codes, labels = factorize_sensitive(sensitive_features)
+    n_groups = len(labels)
+    counts = confusion_counts(np.asarray(fold_ids) * n_groups + codes, n_splits * n_groups, y_true, y_pred,
+                              pos_label=pos_label).reshape(n_splits, n_groups, 4)
+
+    pooled = GroupMetrics(counts.sum(axis=0), labels)
+    fold_totals = counts.sum(axis=1)
+    if min_group_size:
+        keep = pooled.counts.sum(axis=1) >= min_group_size
+        counts, labels, n_groups = counts[:, keep], labels[keep], int(keep.sum())
+
+    dp, eo = disparity_arrays(counts) if n_groups else (np.full(n_splits, np.nan),) * 2
+    folds = pd.DataFrame({
+        'accuracy': rates_from_counts(fold_totals)['accuracy'],
+        'demographic_parity_diff': dp,
+        'equalized_odds_diff': eo,
+        'count': fold_totals.sum(axis=1),
+    }, index=pd.RangeIndex(n_splits, name='fold'))
+
+    # 某折中没有出现的分组不参与该组的统计
+    rates = rates_from_counts(counts)
+    present = rates['count'] > 0
+    spread = {}
+    for metric in SPREAD_METRICS:
+        values = np.where(present, rates[metric], np.nan)
+        spread[metric] = pd.DataFrame({
+            'mean': np.nanmean(values, axis=0),
+            'std': np.nanstd(values, axis=0, ddof=1) if n_splits > 1 else np.zeros(n_groups),
+            'min': np.nanmin(values, axis=0),
+            'max': np.nanmax(values, axis=0),
+        }, index=labels)
+    return {
+        'pooled': pooled,
+        'folds': folds,
+        'group_spread': pd.concat(spread, axis=1),
+        'counts': counts,
+    }
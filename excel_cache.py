@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from storage import default_dir, evict_lru, private_dir
+
+# 转换后的列式文件按工作簿内容哈希 + 工作表存放，多个进程共用；总大小超过上限时淘汰最久未读取的文件
+DEFAULT_MAX_BYTES = int(os.environ.get('FAIRNESS_EXCEL_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+ALL_SHEETS = '*'
+
+logger = logging.getLogger(__name__)
+
+
+def _open(source):
+    # 上传的文件对象读完后移回开头，后续仍可再次读取
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb'), True
+    return source, False
+
+
+def workbook_hash(source, block_size=1024 * 1024):
+    """工作簿内容的 sha256（路径或文件对象），与文件名和修改时间无关"""
+    f, owned = _open(source)
+    try:
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+        return digest.hexdigest()
+    finally:
+        if owned:
+            f.close()
+        else:
+            f.seek(0)
+
+
+def _load_workbook(source):
+    from python_calamine import load_workbook
+    return load_workbook(source)
+
+
+def sheet_names(source):
+    """工作簿中的工作表名称"""
+    try:
+        return list(_load_workbook(source).sheet_names)
+    except ImportError:
+        return list(pd.ExcelFile(source).sheet_names)
+    finally:
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+
+
+def _sheet_frame(rows):
+    """calamine 的行数据 -> DataFrame：首行为表头，空单元格记为缺失值，取值全为整数的列转为整数类型"""
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows[1:], columns=[str(col) for col in rows[0]])
+    df = df.replace('', np.nan).infer_objects()
+    # 与 pd.read_excel 一致：整数单元格读出为整数而不是浮点数
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == np.float64 and values.notna().all() and (values % 1 == 0).all():
+            df[col] = values.astype(np.int64)
+    return df
+
+
+def read_sheets(source, sheets):
+    """用 calamine（Rust 实现）读取工作表，未安装时退回 pd.read_excel；返回 {工作表名: DataFrame}"""
+    try:
+        workbook = _load_workbook(source)
+    except ImportError:
+        logger.debug("未安装 python-calamine，使用 pd.read_excel")
+        names = pd.ExcelFile(source).sheet_names
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+        return pd.read_excel(source, sheet_name=[names[s] if isinstance(s, int) else s for s in sheets])
+    frames = {}
+    for sheet in sheets:
+        data = workbook.get_sheet_by_index(sheet) if isinstance(sheet, int) else workbook.get_sheet_by_name(sheet)
+        frames[data.name] = _sheet_frame(data.to_python(skip_empty_area=False))
+    return frames
+
+
+def _resolve_sheets(source, sheet_name):
+    """sheet_name 可以是名称、序号、名称/序号列表，或 '*' 表示全部工作表；默认第一个工作表"""
+    if sheet_name is None:
+        return [0]
+    if sheet_name == ALL_SHEETS:
+        return sheet_names(source)
+    if isinstance(sheet_name, (list, tuple)):
+        return list(sheet_name)
+    return [sheet_name]
+
+
+def _cache_dir(cache_dir=None):
+    # 默认目录在调用时解析（FAIRNESS_EXCEL_CACHE_DIR 或临时目录下按用户区分的子目录）
+    return private_dir(cache_dir or default_dir('FAIRNESS_EXCEL_CACHE_DIR', 'ai-fairness-excel'))
+
+
+def evict(cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+    """删除最久未读取的列式文件，直到总大小回到上限以内"""
+    evict_lru(_cache_dir(cache_dir), max_bytes, lambda entry: entry.name.endswith('.arrow'))
+
+
+def _cache_path(cache_dir, content_hash, sheets):
+    key = hashlib.sha256(f"{content_hash}:{json.dumps(sheets)}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{key}.arrow")
+
+
+def _write_columnar(df, path):
+    """写成未压缩的 Arrow IPC 文件（读取时可内存映射）；先写临时文件再原子替换"""
+    import pyarrow.feather as feather
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except Exception:
+        # 混合类型的列无法转成 Arrow 时不缓存，本次结果照常返回
+        logger.debug("Excel 转换结果无法写成列式文件", exc_info=True)
+        os.remove(tmp_path)
+        return False
+    return True
+
+
+def _convert(source, sheet_name, cache_dir, content_hash=None, use_cache=True):
+    """返回 (缓存路径, 本次解析出的 DataFrame)：缓存命中时 DataFrame 为 None，无法缓存时路径为 None
+
+    content_hash 为调用方已算好的工作簿 sha256（如上传时 HashingSpool 边接收边计算的摘要），省去再读一遍文件。
+    """
+    cache_dir = _cache_dir(cache_dir)
+    sheets = _resolve_sheets(source, sheet_name)
+    path = _cache_path(cache_dir, content_hash or workbook_hash(source), sheets)
+    if use_cache:
+        try:
+            # 以修改时间记录最近读取，供淘汰使用
+            os.utime(path)
+            logger.debug("Excel 列式缓存命中: %s", path)
+            return path, None
+        except FileNotFoundError:
+            pass
+
+    frames = read_sheets(source, sheets)
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    # 多个工作表按行拼接（表头需一致）
+    df = next(iter(frames.values())) if len(frames) == 1 else pd.concat(frames.values(), ignore_index=True)
+    if not _write_columnar(df, path):
+        return None, df
+    evict(cache_dir)
+    return path, df
+
+
+def excel_columns(source, sheet_name=None, cache_dir=None, content_hash=None):
+    """工作表的列名；首次调用即完成转换，随后的 load_excel 直接命中缓存"""
+    import pyarrow as pa
+
+    path, df = _convert(source, sheet_name, cache_dir, content_hash)
+    if df is None:
+        try:
+            return pa.ipc.open_file(pa.memory_map(path)).schema.names
+        except FileNotFoundError:
+            # 命中后刚被其他进程淘汰，重新解析工作簿
+            _, df = _convert(source, sheet_name, cache_dir, content_hash, use_cache=False)
+    return df.columns.tolist()
+
+
+def _select(df, columns, dtype):
+    # 本次解析出的整表 DataFrame 只保留需要的列
+    if columns is not None:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"列不存在: {missing}")
+        df = df[columns]
+    return df.astype(dtype) if dtype else df
+
+
+def load_excel(source, columns=None, dtype=None, sheet_name=None, cache_dir=None, content_hash=None):
+    """读取 Excel：首次按内容哈希转换为列式缓存文件，之后同一工作簿直接内存映射读取需要的列"""
+    import pyarrow.feather as feather
+
+    path, df = _convert(source, sheet_name, cache_dir, content_hash)
+    if df is not None:
+        return _select(df, columns, dtype)
+    try:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    except FileNotFoundError:
+        # 命中后刚被其他进程淘汰，重新解析工作簿
+        _, df = _convert(source, sheet_name, cache_dir, content_hash, use_cache=False)
+        return _select(df, columns, dtype)
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    return df.astype(dtype) if dtype else df
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+
+# 每个分组的混淆矩阵计数列，顺序与 sklearn confusion_matrix(...).ravel() 一致
+TN, FP, FN, TP = 0, 1, 2, 3
+METRIC_COLUMNS = ['accuracy', 'precision', 'recall', 'selection_rate', 'count']
+
+
+def factorize_groups(sensitive_features):
+    """把敏感特征编码成整数分组编号，返回 (codes, labels)，labels 已排序"""
+    codes, labels = pd.factorize(pd.Series(sensitive_features), sort=True)
+    if (codes < 0).any():
+        raise ValueError("敏感特征列中存在缺失值，请先进行预处理")
+    return codes, labels
+
+
+def factorize_intersections(sensitive_frame):
+    """多列敏感特征的交叉分组：逐列合并整数编码（不拼接字符串），返回 (codes, MultiIndex labels)"""
+    column_codes, column_labels = [], []
+    key = np.zeros(len(sensitive_frame), dtype=np.int64)
+    for col in sensitive_frame.columns:
+        codes, labels = factorize_groups(sensitive_frame[col])
+        column_codes.append(codes)
+        column_labels.append(labels)
+        # 每合并一列就重新压缩成连续编号，组合数再多也不会溢出
+        key, _ = pd.factorize(key * len(labels) + codes)
+
+    n_groups = int(key.max()) + 1 if len(key) else 0
+    # 每个交叉分组取一行作代表，还原出各列的原始标签
+    first = np.empty(n_groups, dtype=np.int64)
+    first[key[::-1]] = np.arange(len(key) - 1, -1, -1)
+    representative = [codes[first] for codes in column_codes]
+    # 按各列（已排序的）标签顺序排列分组，与单列时的排序规则一致
+    order = np.lexsort(representative[::-1])
+    rank = np.empty(n_groups, dtype=np.int64)
+    rank[order] = np.arange(n_groups)
+    labels = pd.MultiIndex.from_arrays(
+        [col_labels[codes[order]] for col_labels, codes in zip(column_labels, representative)],
+        names=list(sensitive_frame.columns))
+    return rank[key], labels
+
+
+def factorize_sensitive(sensitive_features):
+    """单列或多列敏感特征统一编码，返回 (codes, labels)；多列时按交叉分组编码"""
+    if isinstance(sensitive_features, pd.DataFrame):
+        if sensitive_features.shape[1] > 1:
+            return factorize_intersections(sensitive_features)
+        sensitive_features = sensitive_features.iloc[:, 0]
+    codes, labels = factorize_groups(sensitive_features)
+    return codes, pd.Index(labels, name=getattr(sensitive_features, 'name', None))
+
+
+def restore_labels(labels, category_mappings):
+    """把预处理时编码成整数的分组标签换回原始标签；category_mappings 为 {列名: 按编码排列的原始标签}"""
+    def restore(index):
+        mapping = category_mappings.get(index.name)
+        # 空映射（该列未编码）视为没有映射
+        if mapping is None or len(mapping) == 0:
+            return index
+        return pd.Index(np.asarray(mapping, dtype=object)[index.to_numpy(dtype=np.int64)], name=index.name)
+
+    if not category_mappings:
+        return labels
+    if isinstance(labels, pd.MultiIndex):
+        return pd.MultiIndex.from_arrays([restore(labels.get_level_values(i)) for i in range(labels.nlevels)],
+                                         names=labels.names)
+    return restore(labels)
+
+
+def outcome_codes(y_true, y_pred, pos_label=1):
+    """真实值 * 2 + 预测值，取值 0..3 依次对应 TN/FP/FN/TP"""
+    return (np.asarray(y_true) == pos_label) * np.int64(2) + (np.asarray(y_pred) == pos_label)
+
+
+def confusion_counts(codes, n_groups, y_true, y_pred, pos_label=1):
+    """一次 bincount 统计每组的 TN/FP/FN/TP，返回形状为 (n_groups, 4) 的数组"""
+    # 分组编号 * 4 + 真实值 * 2 + 预测值 -> 每行落入唯一的计数桶
+    keys = np.asarray(codes, dtype=np.int64) * 4 + outcome_codes(y_true, y_pred, pos_label)
+    return np.bincount(keys, minlength=n_groups * 4).reshape(n_groups, 4)
+
+
+def _safe_divide(numerator, denominator):
+    # 与 sklearn 的 zero_division 行为一致：分母为 0 时记为 0
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def rates_from_counts(counts):
+    """由计数数组推导各项比率，counts 最后一维为 TN/FP/FN/TP"""
+    counts = np.asarray(counts)
+    tn, fp, fn, tp = (counts[..., i] for i in (TN, FP, FN, TP))
+    total = tn + fp + fn + tp
+    return {
+        'accuracy': _safe_divide(tp + tn, total),
+        'precision': _safe_divide(tp, tp + fp),
+        'recall': _safe_divide(tp, tp + fn),
+        'selection_rate': _safe_divide(tp + fp, total),
+        'false_positive_rate': _safe_divide(fp, fp + tn),
+        'count': total,
+    }
+
+
+def demographic_parity_difference(counts):
+    """组间选择率的最大差值（越接近0越公平）"""
+    if np.size(counts) == 0:
+        return float('nan')
+    selection_rate = rates_from_counts(counts)['selection_rate']
+    return float(selection_rate.max(axis=-1) - selection_rate.min(axis=-1))
+
+
+def equalized_odds_difference(counts):
+    """真正例率差值与假正例率差值中的较大者（越接近0越公平）"""
+    if np.size(counts) == 0:
+        return float('nan')
+    rates = rates_from_counts(counts)
+    tpr, fpr = rates['recall'], rates['false_positive_rate']
+    tpr_diff = tpr.max(axis=-1) - tpr.min(axis=-1)
+    fpr_diff = fpr.max(axis=-1) - fpr.min(axis=-1)
+    return float(np.maximum(tpr_diff, fpr_diff))
+
+
+class GroupMetrics:
+    """分组指标结果，by_group / overall 与 fairlearn MetricFrame 的用法保持一致"""
+
+    def __init__(self, counts, labels, name=None):
+        self.counts = np.asarray(counts)
+        self.labels = labels if isinstance(labels, pd.MultiIndex) else pd.Index(labels, name=name)
+        self.by_group = self._table(self.counts, self.labels)
+        self.overall = self._table(self.counts.sum(axis=0, keepdims=True), [None]).iloc[0]
+
+    @staticmethod
+    def _table(counts, index):
+        rates = rates_from_counts(counts)
+        table = pd.DataFrame({col: rates[col] for col in METRIC_COLUMNS}, index=index)
+        # 抽样估计的计数是浮点数，取整后再转换，避免 999.9999 截断成 999
+        table['count'] = table['count'].round().astype(np.int64)
+        return table
+
+    def filter(self, min_group_size):
+        """只保留样本数不少于 min_group_size 的分组（稀疏的交叉分组会让差异指标失真）"""
+        keep = self.counts.sum(axis=1) >= min_group_size
+        return GroupMetrics(self.counts[keep], self.labels[keep], name=self.labels.name)
+
+    def relabel(self, category_mappings):
+        """把预处理时编码成整数的分组换回原始标签；category_mappings 为 {列名: 按编码排列的原始标签}"""
+        if not category_mappings:
+            return self
+        return GroupMetrics(self.counts, restore_labels(self.labels, category_mappings), name=self.labels.name)
+
+    def demographic_parity_difference(self):
+        return demographic_parity_difference(self.counts)
+
+    def equalized_odds_difference(self):
+        return equalized_odds_difference(self.counts)
+
+    def weighted_precision_recall(self):
+        """整体精确率/召回率（average='weighted'，按真实标签的样本数加权）"""
+        tn, fp, fn, tp = self.counts.sum(axis=0)
+        total = tn + fp + fn + tp
+        if total == 0:
+            return 0.0, 0.0
+        precision_pos = tp / (tp + fp) if tp + fp else 0.0
+        precision_neg = tn / (tn + fn) if tn + fn else 0.0
+        precision = (precision_pos * (tp + fn) + precision_neg * (tn + fp)) / total
+        # 二分类下按支持度加权的召回率恰好等于准确率
+        recall = (tp + tn) / total
+        return float(precision), float(recall)
+
+
+def compute_group_metrics(y_true, y_pred, sensitive_features, pos_label=1):
+    """分组编码一次、计数一次，得到全部分组指标；传入多列 DataFrame 时按交叉分组统计"""
+    codes, labels = factorize_sensitive(sensitive_features)
+    counts = confusion_counts(codes, len(labels), y_true, y_pred, pos_label=pos_label)
+    return GroupMetrics(counts, labels)
+
+
+def compute_multi_group_metrics(y_true, y_pred, sensitive_frame, pos_label=1):
+    """多个敏感特征共用一次计数：各列的分组编号依次错开后拼接，一次 bincount 得到全部分组"""
+    outcomes = outcome_codes(y_true, y_pred, pos_label)
+    keys, group_labels, offset = [], [], 0
+    for col in sensitive_frame.columns:
+        codes, labels = factorize_groups(sensitive_frame[col])
+        keys.append((codes.astype(np.int64) + offset) * 4 + outcomes)
+        group_labels.append(labels)
+        offset += len(labels)
+    counts = np.bincount(np.concatenate(keys), minlength=offset * 4).reshape(offset, 4)
+
+    results, start = {}, 0
+    for col, labels in zip(sensitive_frame.columns, group_labels):
+        results[col] = GroupMetrics(counts[start:start + len(labels)], labels, name=col)
+        start += len(labels)
+    return results
+
+
+class GroupCounter:
+    """可合并的分组计数器：按块累加每组的 TN/FP/FN/TP，用于分块/流式计算"""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.index = {}  # 分组标签 -> 行号（按首次出现顺序）
+        self.counts = np.zeros((0, 4), dtype=np.int64)
+
+    def _grow(self):
+        if len(self.index) > len(self.counts):
+            extra = np.zeros((len(self.index) - len(self.counts), 4), dtype=np.int64)
+            self.counts = np.vstack([self.counts, extra])
+
+    def update(self, y_true, y_pred, sensitive_features, pos_label=1):
+        codes, labels = pd.factorize(pd.Series(sensitive_features))
+        if (codes < 0).any():
+            raise ValueError("敏感特征列中存在缺失值，请先进行预处理")
+        # 本块的局部编号 -> 全局行号
+        lookup = np.array([self.index.setdefault(label, len(self.index)) for label in labels], dtype=np.int64)
+        self._grow()
+        self.counts += confusion_counts(lookup[codes], len(self.counts), y_true, y_pred, pos_label=pos_label)
+        return self
+
+    def merge(self, other):
+        """合并另一个计数器（例如另一个分块或另一个进程的结果）"""
+        rows = np.array([self.index.setdefault(label, len(self.index)) for label in other.index], dtype=np.int64)
+        self._grow()
+        np.add.at(self.counts, rows, other.counts)
+        return self
+
+    def result(self):
+        labels, order = pd.Index(list(self.index)).sort_values(return_indexer=True)
+        return GroupMetrics(self.counts[order], labels, name=self.name)
@@ -0,0 +1,11 @@
+import os
+
+# 在 master 中加载应用（含 wsgi.py 里的预热导入），worker 通过 fork 继承，启动不再重复导入
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+
+def post_fork(server, worker):
+    # 线程池、OpenMP 线程等都在 worker 中首次使用时才创建，fork 前的 master 不持有任何线程
+    server.log.info(f"worker {worker.pid} 已启动（preload）")
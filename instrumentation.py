@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+try:
+    import resource  # Windows 上没有，此时不统计内存
+except ImportError:
+    resource = None
+
+# 每个阶段保留最近的若干次样本用于计算分位数，内存占用有上限
+MAX_SAMPLES_PER_STAGE = int(os.environ.get('FAIRNESS_METRICS_SAMPLES', 1000))
+
+_current_profile = ContextVar('fairness_profile', default=None)
+_stats_lock = threading.Lock()
+_stage_samples = {}
+_stage_counts = {}
+
+
+def configure_logging(level=None):
+    """日志级别取自 FAIRNESS_LOG_LEVEL（默认 INFO）；调试信息使用 DEBUG 级别，默认不输出"""
+    level = level or os.environ.get('FAIRNESS_LOG_LEVEL', 'INFO')
+    logging.basicConfig(level=level.upper(), format='%(message)s')
+
+
+def _peak_rss_mb():
+    # 进程内存峰值（Linux 上 ru_maxrss 单位为 KB，macOS 上为字节）
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+class Profile:
+    """一次分析中各阶段的耗时与内存记录"""
+
+    def __init__(self):
+        self.stages = []
+
+    def add(self, record):
+        self.stages.append(record)
+
+    def table(self):
+        import pandas as pd
+        return pd.DataFrame(self.stages, columns=['stage', 'wall_ms', 'cpu_ms', 'peak_rss_mb', 'rss_growth_mb'])
+
+    def __str__(self):
+        if not self.stages:
+            return '（无阶段记录）'
+        return self.table().round(1).to_string(index=False)
+
+
+@contextmanager
+def profile():
+    """在 with 块内收集所有 stage() 的记录，返回 Profile"""
+    current = Profile()
+    token = _current_profile.set(current)
+    try:
+        yield current
+    finally:
+        _current_profile.reset(token)
+
+
+def start_profile():
+    """为当前上下文开启记录（命令行这类一次性运行使用），返回 Profile"""
+    current = Profile()
+    _current_profile.set(current)
+    return current
+
+
+@contextmanager
+def stage(name):
+    """记录一个阶段的墙钟时间、CPU 时间和进程内存峰值的增长，同时计入全局统计"""
+    peak_before = _peak_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        cpu_ms = (time.process_time() - cpu_start) * 1000
+        peak_after = _peak_rss_mb()
+        record = {
+            'stage': name,
+            'wall_ms': wall_ms,
+            'cpu_ms': cpu_ms,
+            'peak_rss_mb': peak_after,
+            'rss_growth_mb': peak_after - peak_before if peak_after is not None else None,
+        }
+        current = _current_profile.get()
+        if current is not None:
+            current.add(record)
+        with _stats_lock:
+            _stage_samples.setdefault(name, deque(maxlen=MAX_SAMPLES_PER_STAGE)).append((wall_ms, cpu_ms))
+            _stage_counts[name] = _stage_counts.get(name, 0) + 1
+
+
+def stage_metrics():
+    """各阶段的累计次数与最近样本的耗时分位数（毫秒）；每个进程单独统计，多 worker 部署时不跨进程汇总"""
+    with _stats_lock:
+        snapshot = {name: (np.array(samples), _stage_counts[name]) for name, samples in _stage_samples.items()}
+    metrics = {}
+    for name, (samples, count) in sorted(snapshot.items()):
+        wall_p50, wall_p95, wall_p99 = np.percentile(samples[:, 0], [50, 95, 99])
+        metrics[name] = {
+            'count': count,
+            'wall_ms_p50': round(float(wall_p50), 3),
+            'wall_ms_p95': round(float(wall_p95), 3),
+            'wall_ms_p99': round(float(wall_p99), 3),
+            'cpu_ms_p50': round(float(np.percentile(samples[:, 1], 50)), 3),
+        }
+    return metrics
+
+
+def reset_metrics():
+    with _stats_lock:
+        _stage_samples.clear()
+        _stage_counts.clear()
@@ -1,19 +1,12 @@
+import logging
 import pandas as pd
-from fairlearn.metrics import(
-    demographic_parity_difference ,
-    equalized_odds_difference,
-    MetricFrame,
-    selection_rate,
-    count
-)
-from fairlearn.reductions import GridSearch,DemographicParity
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import  train_test_split
-from sklearn.metrics import accuracy_score,precision_score,recall_score
-import streamlit as st
 import warnings
+from group_metrics import compute_group_metrics
+from instrumentation import configure_logging
 warnings.filterwarnings("ignore")
 
+logger = logging.getLogger(__name__)
+
 
 def load_data(file_path,file_type='csv'):
     try:
@@ -24,11 +17,10 @@ def load_data(file_path,file_type='csv'):
         else:
             raise ValueError("文件类型必须是'excel'或‘csv'")
         print(f"✅ 数据加载成功！形状: {df.shape}")
-        print(f"📊 数据列: {list(df.columns)}")
-        print("\n🔍 数据前5行:")
-        print(df.head())
-        print("\n📋 数据基本信息:")
-        print(df.info())
+        logger.debug("📊 数据列: %s", list(df.columns))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\n🔍 数据前5行:\n%s", df.head())
+            logger.debug("\n📋 数据类型:\n%s", df.dtypes)
 
         return df
     except Exception as e:
@@ -37,17 +29,16 @@ def load_data(file_path,file_type='csv'):
 
 
 def data_preprocessing(df, features, sensitive_feature, target_column):
-    """调试版预处理"""
+    """选择所需列、删除缺失值并对分类列编码；中间信息以 DEBUG 级别记录"""
     try:
-        print("=== 调试预处理开始 ===")
-        print(f"输入数据形状: {df.shape}")
-        print(f"特征: {features}")
-        print(f"敏感特征: {sensitive_feature}")
-        print(f"目标变量: {target_column}")
+        logger.debug("输入数据形状: %s", df.shape)
+        logger.debug("特征: %s", features)
+        logger.debug("敏感特征: %s", sensitive_feature)
+        logger.debug("目标变量: %s", target_column)
 
         # 选择需要的列
         required_columns = features + [sensitive_feature, target_column]
-        print(f"需要的列: {required_columns}")
+        logger.debug("需要的列: %s", required_columns)
 
         # 检查列是否存在
         for col in required_columns:
@@ -56,36 +47,37 @@ def data_preprocessing(df, features, sensitive_feature, target_column):
                 return None, None
 
         df_clean = df[required_columns].copy()
-        print(f"选择列后形状: {df_clean.shape}")
+        logger.debug("选择列后形状: %s", df_clean.shape)
 
         # 删除缺失值
         df_clean = df_clean.dropna()
-        print(f"删除缺失值后形状: {df_clean.shape}")
+        logger.debug("删除缺失值后形状: %s", df_clean.shape)
 
         if len(df_clean) == 0:
             print("警告: 清理后没有数据了")
             return None, None
 
-        print("数据类型:")
-        print(df_clean.dtypes)
+        logger.debug("数据类型:\n%s", df_clean.dtypes)
 
         # 编码分类变量
         object_cols = df_clean.select_dtypes(include=['object']).columns
-        print(f"需要编码的列: {list(object_cols)}")
+        logger.debug("需要编码的列: %s", list(object_cols))
 
         for col in object_cols:
-            print(f"处理列: {col}")
+            logger.debug("编码列: %s", col)
             df_clean[col] = pd.factorize(df_clean[col])[0]
 
         print("✅ 预处理成功!")
         return df_clean, features
 
     except Exception as e:
-        print(f"❌ 调试预处理错误: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"❌ 预处理错误: {e}")
+        logger.debug("预处理错误详情", exc_info=True)
         return None, None
 def fairlearn_analysis(df,sensitive_feature,target_column,features):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+
     X = df[features]
     y = df[target_column]
     A = df[sensitive_feature]
@@ -102,21 +94,12 @@ def fairlearn_analysis(df,sensitive_feature,target_column,features):
     A_test = test[sensitive_feature].squeeze(axis=1) if isinstance(test[sensitive_feature], pd.DataFrame) else test[
         sensitive_feature]
 
-    # ---------------------- 新增调试修复代码开始 ----------------------
-    print("🔍 调试：敏感特征数据结构检查")
-    print(f"敏感特征列形状: {A_test.shape}")
-    print(f"敏感特征列类型: {type(A_test)}")
+    logger.debug("敏感特征列形状: %s, 类型: %s", A_test.shape, type(A_test))
 
-    # 确保敏感特征列为一维（修复核心逻辑）
+    # 确保敏感特征列为一维（重复列名时 test[sensitive_feature] 是 DataFrame）
     if len(A_test.shape) > 1:
-        print(f"⚠️  发现多维敏感特征，自动转为一维...")
-        # 方式1：适用于多维数组（优先使用）
+        logger.debug("发现多维敏感特征，取第一列")
         A_test = A_test.iloc[:,0]
-        print(f"敏感特征列形状: {A_test.shape}")
-        print(f"敏感特征列类型: {type(A_test)}")
-        # 若方式1失败，注释上面一行，启用方式2（适用于嵌套列表）
-        # A_test = A_test.explode().reset_index(drop=True)
-    # ---------------------- 新增调试修复代码结束 ----------------------
     print(f"\n📊 数据分割:")
     print(f"训练集: {X_train.shape[0]} 样本")
     print(f"测试集: {X_test.shape[0]} 样本")
@@ -132,38 +115,26 @@ def fairlearn_analysis(df,sensitive_feature,target_column,features):
     print("📊 FAIRLEARN 公平性分析报告")
     print("=" * 60)
 
+    # 单次分组计数：整体性能、分组指标与公平性差异都由同一组 TP/FP/TN/FN 推导
+    metric_frame = compute_group_metrics(y_test, y_pred_base, A_test)
+
     # 基础模型性能
-    base_accuracy = accuracy_score(y_test, y_pred_base)
-    base_precision = precision_score(y_test, y_pred_base, average='weighted')
-    base_recall = recall_score(y_test, y_pred_base, average='weighted')
+    base_accuracy = metric_frame.overall['accuracy']
+    base_precision, base_recall = metric_frame.weighted_precision_recall()
 
     print(f"\n🎯 基础模型性能:")
     print(f"准确率: {base_accuracy:.3f}")
     print(f"精确率: {base_precision:.3f}")
     print(f"召回率: {base_recall:.3f}")
-    # 基础模型性能
-    dp_diff = demographic_parity_difference(y_test,y_pred_base,sensitive_features=A_test)
-    eo_diff = equalized_odds_difference(y_test,y_pred_base,sensitive_features=A_test)
+
+    # 公平性指标
+    dp_diff = metric_frame.demographic_parity_difference()
+    eo_diff = metric_frame.equalized_odds_difference()
 
     print(f"\n⚖️ 公平性指标:")
     print(f"统计均等差异: {dp_diff:.3f} (越接近0越公平)")
     print(f"均等几率差异: {eo_diff:.3f} (越接近0越公平)")
 
-    metrics = {
-        'accuracy': accuracy_score,
-        'precision': lambda y_true, y_pred: precision_score(y_true, y_pred, average='binary'),
-        'recall': lambda y_true, y_pred: recall_score(y_true, y_pred, average='binary'),
-        'selection_rate': selection_rate,
-        'count': count,
-    }
-
-    metric_frame = MetricFrame(
-        metrics=metrics,
-        y_true=y_test,
-        y_pred=y_pred_base,
-        sensitive_features=A_test,
-    )
-
     print(f"\n📋 按 [{sensitive_feature}] 分组的详细指标:")
     print(metric_frame.by_group.round(3))
 
@@ -190,6 +161,7 @@ def fairlearn_analysis(df,sensitive_feature,target_column,features):
     }
 
 if __name__ == '__main__':
+    configure_logging()
     print("⚠️  注意：当前模式将训练一个新的随机森林模型用于测试")
     print("AI安全性分析工具")
     print("1.加载数据文件")
@@ -242,10 +214,9 @@ if __name__ == '__main__':
         target_idx = input("请输入1个目标变量列的编号: ").strip()
         target_column = all_columns[int(target_idx) - 1] if target_idx.isdigit() else None
 
-        print(f"\n🔍 调试信息:")
-        print(f"features: {features} (长度: {len(features)})")
-        print(f"sensitive_feature: {sensitive_feature}")
-        print(f"target_column: {target_column}")
+        logger.debug("features: %s (长度: %d)", features, len(features))
+        logger.debug("sensitive_feature: %s", sensitive_feature)
+        logger.debug("target_column: %s", target_column)
 
         # 验证选择
         if not features or not sensitive_feature or not target_column:
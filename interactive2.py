@@ -1,34 +1,126 @@
 import pandas as pd
-from fairlearn.metrics import(
-    demographic_parity_difference ,
-    equalized_odds_difference,
-    MetricFrame,
-    selection_rate,
-    count
-)
-from fairlearn.reductions import GridSearch,DemographicParity
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import  train_test_split
-from sklearn.metrics import accuracy_score,precision_score,recall_score
-import streamlit as st
+import numpy as np
+import os
+import logging
 import warnings
+from group_metrics import (TN, FP, FN, TP, GroupMetrics, compute_group_metrics, compute_multi_group_metrics,
+                           rates_from_counts, restore_labels)
+from bootstrap_ci import bootstrap_fairness_ci
+from threshold_analysis import compute_threshold_curves
+from instrumentation import configure_logging, stage, start_profile
+from parallel import resolve_n_jobs
 warnings.filterwarnings("ignore")
 
+logger = logging.getLogger(__name__)
 
-def load_data(file_path,file_type='csv'):
+
+def analysis_columns(features, sensitive_feature, target_column, prediction_column=None, score_column=None):
+    """分析实际用到的列（去重并保持顺序），预处理与加载时的列裁剪共用；敏感特征可以是多列"""
+    sensitive_columns = [sensitive_feature] if isinstance(sensitive_feature, str) else list(sensitive_feature)
+    columns = list(features) + sensitive_columns + [target_column, prediction_column, score_column]
+    return list(dict.fromkeys(col for col in columns if col))
+
+
+def analysis_dtypes(score_column=None):
+    """已知类型的列：得分列固定按 float64 解析，其余列交给 pandas 推断"""
+    return {score_column: 'float64'} if score_column else None
+
+
+ARROW_FILE_TYPES = ('parquet', 'feather', 'arrow')
+# 分块评估与近似扫描时每块读取的行数
+STREAM_CHUNKSIZE = 200_000
+
+
+def can_stream(file_type, sensitive_feature):
+    """单个敏感特征的 csv / parquet / feather 评估可以分块流式处理；Excel 与交叉分组需要整表载入"""
+    return isinstance(sensitive_feature, str) and file_type.lower() in ('csv',) + ARROW_FILE_TYPES
+
+
+def _arrow_source(file_path):
+    import pyarrow as pa
+    # 本地文件直接内存映射，上传的文件对象原样交给 pyarrow
+    return pa.memory_map(file_path) if isinstance(file_path, (str, os.PathLike)) else file_path
+
+
+def read_arrow_table(file_path, file_type, columns=None):
+    """读取 parquet / Arrow IPC(feather) 文件为 Arrow 表，只读取需要的列"""
+    if file_type.lower() == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(file_path, columns=columns, memory_map=True)
+    import pyarrow.feather as feather
+    return feather.read_table(file_path, columns=columns, memory_map=True)
+
+
+def iter_arrow_batches(file_path, file_type, chunksize, columns=None):
+    """分批读取：parquet 按行组内的批次迭代，Arrow IPC 按文件中的 record batch 迭代"""
+    if file_type.lower() == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file_path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas(split_blocks=True)
+    else:
+        import pyarrow as pa
+        reader = pa.ipc.open_file(_arrow_source(file_path))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield (batch.select(columns) if columns else batch).to_pandas(split_blocks=True)
+
+
+def read_columns(file_path,file_type='csv',sheet_name=None,content_hash=None):
+    """只读取表头，返回所有列名；Excel 在此时即转换为列式缓存，随后的 load_data 直接命中
+    content_hash 为已算好的文件 sha256（如上传摘要），Excel 缓存据此查找，不再读一遍文件"""
+    if file_type.lower() == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path).names
+    elif file_type.lower() in ARROW_FILE_TYPES:
+        import pyarrow as pa
+        return pa.ipc.open_file(_arrow_source(file_path)).schema.names
+    elif file_type.lower() == 'csv':
+        return pd.read_csv(file_path, nrows=0).columns.tolist()
+    elif file_type.lower() == 'excel':
+        from excel_cache import excel_columns
+        return excel_columns(file_path, sheet_name, content_hash=content_hash)
+    raise ValueError("文件类型必须是'excel'、‘csv'、'parquet'或'feather'")
+
+
+def load_data(file_path,file_type='csv',chunksize=None,columns=None,dtype=None,sheet_name=None,content_hash=None):
+    """加载数据；columns 指定时只解析这些列（usecols），dtype 为已知列的类型
+    sheet_name 为 Excel 的工作表（名称、序号、列表或 '*' 表示全部，默认第一个）
+    content_hash 同 read_columns；chunksize 给定时返回按块迭代的 reader，CSV 分块时各列按文本读取（dtype 不生效）"""
     try:
-        if file_type.lower() == 'csv':
-            df = pd.read_csv(file_path)
-        elif file_type.lower() == 'excel':
-            df = pd.read_excel(file_path)
-        else:
-            raise ValueError("文件类型必须是'excel'或‘csv'")
+        if chunksize:
+            # 分块读取：返回按块迭代的 reader，不一次性载入整个文件
+            if file_type.lower() in ARROW_FILE_TYPES:
+                reader = iter_arrow_batches(file_path, file_type, chunksize, columns)
+            elif file_type.lower() == 'csv':
+                # pandas 对每块单独推断类型，同一列可能一块读成数字、另一块读成字符串；
+                # 分块时一律按文本读取，由分块评估在读完后按整表读取的规则确定类型
+                reader = pd.read_csv(file_path, chunksize=chunksize, usecols=columns, dtype=str)
+            else:
+                raise ValueError("分块读取仅支持'csv'、'parquet'或'feather'文件")
+            print(f"✅ 已按分块方式打开数据（每块 {chunksize} 行）")
+            return reader
+        with stage('load'):
+            if file_type.lower() in ARROW_FILE_TYPES:
+                # 列式文件自带类型；无缺失值的数值列在转换时直接复用 Arrow 内存，不再复制
+                df = read_arrow_table(file_path, file_type, columns).to_pandas(split_blocks=True, self_destruct=True)
+            elif file_type.lower() == 'csv':
+                # 本地文件（包括已落盘的上传）内存映射后解析
+                df = pd.read_csv(file_path, usecols=columns, dtype=dtype,
+                                 memory_map=isinstance(file_path, (str, os.PathLike)))
+            elif file_type.lower() == 'excel':
+                # 同一工作簿只解析一次，之后读取按内容哈希缓存的列式文件
+                from excel_cache import load_excel
+                df = load_excel(file_path, columns=columns, dtype=dtype, sheet_name=sheet_name,
+                                content_hash=content_hash)
+            else:
+                raise ValueError("文件类型必须是'excel'、‘csv'、'parquet'或'feather'")
         print(f"✅ 数据加载成功！形状: {df.shape}")
-        print(f"📊 数据列: {list(df.columns)}")
-        print("\n🔍 数据前5行:")
-        print(df.head())
-        print("\n📋 数据基本信息:")
-        print(df.info())
+        logger.debug("📊 数据列: %s", list(df.columns))
+        # 前几行与列信息的格式化开销较大，只在开启 DEBUG 时生成
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\n🔍 数据前5行:\n%s", df.head())
+            logger.debug("\n📋 数据类型:\n%s", df.dtypes)
 
         return df
     except Exception as e:
@@ -36,209 +128,913 @@ def load_data(file_path,file_type='csv'):
         return None
 
 
-def data_preprocessing(df, features, sensitive_feature, target_column):
-    """调试版预处理"""
+def _downcast(values):
+    """整数降到能容纳取值范围的最小类型；浮点数只在转成 float32 不损失精度时才降级"""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return pd.to_numeric(values, downcast='integer')
+    if values.dtype == np.float64:
+        as_float32 = values.astype(np.float32)
+        if np.array_equal(as_float32.to_numpy(), values.to_numpy()):
+            return as_float32
+    return values
+
+
+def _is_label_column(values):
+    """字符串或类别列（parquet / feather 的字典列读出为 category）按标签编码；整表预处理与分块评估共用"""
+    return values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def data_preprocessing(df, features, sensitive_feature, target_column, prediction_column=None, score_column=None):
+    """预处理：删除缺失行、编码分类列并压缩数值类型（模型评估模式下额外保留预测列与得分列）
+    编码前的原始标签保存在返回结果的 attrs['category_mappings'] 中"""
     try:
-        print("=== 调试预处理开始 ===")
-        print(f"输入数据形状: {df.shape}")
-        print(f"特征: {features}")
-        print(f"敏感特征: {sensitive_feature}")
-        print(f"目标变量: {target_column}")
-
-        # 选择需要的列
-        required_columns = features + [sensitive_feature, target_column]
-        print(f"需要的列: {required_columns}")
-
-        # 检查列是否存在
-        for col in required_columns:
-            if col not in df.columns:
-                print(f"❌ 列不存在: {col}")
-                return None, None
+        with stage('preprocess'):
+            logger.debug("=== 调试预处理开始 ===")
+            logger.debug("输入数据形状: %s", df.shape)
+            logger.debug("特征: %s", features)
+            logger.debug("敏感特征: %s", sensitive_feature)
+            logger.debug("目标变量: %s", target_column)
 
-        df_clean = df[required_columns].copy()
-        print(f"选择列后形状: {df_clean.shape}")
+            # 选择需要的列
+            required_columns = analysis_columns(features, sensitive_feature, target_column,
+                                                prediction_column, score_column)
+            logger.debug("需要的列: %s", required_columns)
 
-        # 删除缺失值
-        df_clean = df_clean.dropna()
-        print(f"删除缺失值后形状: {df_clean.shape}")
+            # 检查列是否存在
+            for col in required_columns:
+                if col not in df.columns:
+                    print(f"❌ 列不存在: {col}")
+                    return None, None
 
-        if len(df_clean) == 0:
-            print("警告: 清理后没有数据了")
-            return None, None
+            # 只在需要的列上标记缺失行，不复制整张表
+            keep = None
+            for col in required_columns:
+                missing = df[col].isna().to_numpy()
+                if missing.any():
+                    keep = ~missing if keep is None else keep & ~missing
+            n_rows = len(df) if keep is None else int(keep.sum())
+            logger.debug("删除缺失值后行数: %s", n_rows)
 
-        print("数据类型:")
-        print(df_clean.dtypes)
+            if n_rows == 0:
+                print("警告: 清理后没有数据了")
+                return None, None
 
-        # 编码分类变量
-        object_cols = df_clean.select_dtypes(include=['object']).columns
-        print(f"需要编码的列: {list(object_cols)}")
+            # 逐列清洗：字符串/类别列编码为最小整数类型，数值列降到无损的最小类型
+            columns = {}
+            category_mappings = {}
+            for col in required_columns:
+                values = df[col] if keep is None else df[col][keep]
+                if _is_label_column(values):
+                    logger.debug("编码列: %s", col)
+                    if col == prediction_column and target_column in category_mappings:
+                        # 预测列与目标列共用一套编码，保证同一标签编码一致
+                        labels = category_mappings[target_column]
+                        codes = pd.Categorical(values, categories=labels).codes
+                    else:
+                        codes, labels = pd.factorize(values)
+                        labels = list(labels)
+                    columns[col] = pd.Series(codes.astype(np.min_scalar_type(-max(len(labels), 1))),
+                                             index=values.index)
+                    category_mappings[col] = labels
+                else:
+                    columns[col] = _downcast(values)
 
-        for col in object_cols:
-            print(f"处理列: {col}")
-            df_clean[col] = pd.factorize(df_clean[col])[0]
+            df_clean = pd.DataFrame(columns)
+            # 编码与原始标签的对应关系，报告中据此显示原始分组名
+            df_clean.attrs['category_mappings'] = category_mappings
+            logger.debug("数据类型:\n%s", df_clean.dtypes)
 
-        print("✅ 预处理成功!")
-        return df_clean, features
+            print("✅ 预处理成功!")
+            return df_clean, features
 
     except Exception as e:
-        print(f"❌ 调试预处理错误: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"❌ 预处理错误: {e}")
+        logger.debug("预处理错误详情", exc_info=True)
         return None, None
-def fairlearn_analysis(df,sensitive_feature,target_column,features):
-    X = df[features]
-    y = df[target_column]
-    A = df[sensitive_feature]
 
-    # 将 X、y、A 按列组合，然后进行分割
-    combined = pd.concat([X, y, A], axis=1)
-    train, test = train_test_split(combined, test_size=0.3, random_state=42, stratify=y)
-    X_train = train[features]
-    X_test = test[features]
-    y_train = train[target_column]
-    y_test = test[target_column]
-    A_train = train[sensitive_feature].squeeze(axis=1) if isinstance(train[sensitive_feature], pd.DataFrame) else train[
-        sensitive_feature]
-    A_test = test[sensitive_feature].squeeze(axis=1) if isinstance(test[sensitive_feature], pd.DataFrame) else test[
-        sensitive_feature]
-
-    # ---------------------- 新增调试修复代码开始 ----------------------
-    print("🔍 调试：敏感特征数据结构检查")
-    print(f"敏感特征列形状: {A_test.shape}")
-    print(f"敏感特征列类型: {type(A_test)}")
-
-    # 确保敏感特征列为一维（修复核心逻辑）
-    if len(A_test.shape) > 1:
-        print(f"⚠️  发现多维敏感特征，自动转为一维...")
-        # 方式1：适用于多维数组（优先使用）
-        A_test = A_test.iloc[:,0]
-        print(f"敏感特征列形状: {A_test.shape}")
-        print(f"敏感特征列类型: {type(A_test)}")
-        # 若方式1失败，注释上面一行，启用方式2（适用于嵌套列表）
-        # A_test = A_test.explode().reset_index(drop=True)
-    # ---------------------- 新增调试修复代码结束 ----------------------
-    print(f"\n📊 数据分割:")
-    print(f"训练集: {X_train.shape[0]} 样本")
-    print(f"测试集: {X_test.shape[0]} 样本")
-    print(f"敏感特征分布:")
-    print(A_test.value_counts())
-    # 训练基础模型
-    print("\n🤖 训练基础模型...")
-    base_model = RandomForestClassifier(n_estimators=100, random_state=42)
-    base_model.fit(X_train, y_train)
-    y_pred_base = base_model.predict(X_test)
 
+def fairness_report(y_true, y_pred, A, sensitive_feature, metric_frame=None, min_group_size=None,
+                    bootstrap=0, n_jobs=None, random_state=42, category_mappings=None):
+    """根据真实值、预测值与敏感特征计算并打印公平性报告（也可直接传入已统计好的分组指标）
+    sensitive_feature 为多列时按交叉分组统计；min_group_size 用于排除样本过少的分组；
+    bootstrap > 0 时按该重采样次数给出 DP / EO 差异的 95% 置信区间；
+    category_mappings 为预处理记录的原始标签，报告中的分组据此显示原始名称"""
     print("\n" + "=" * 60)
     print("📊 FAIRLEARN 公平性分析报告")
     print("=" * 60)
 
-    # 基础模型性能
-    base_accuracy = accuracy_score(y_test, y_pred_base)
-    base_precision = precision_score(y_test, y_pred_base, average='weighted')
-    base_recall = recall_score(y_test, y_pred_base, average='weighted')
+    # 单次分组计数：整体性能、分组指标与公平性差异都由同一组 TP/FP/TN/FN 推导
+    if metric_frame is None:
+        with stage('metrics'):
+            metric_frame = compute_group_metrics(y_true, y_pred, A)
+    if category_mappings:
+        metric_frame = metric_frame.relabel(category_mappings)
+
+    # 基础模型性能（始终基于全部样本）
+    base_accuracy = metric_frame.overall['accuracy']
+    base_precision, base_recall = metric_frame.weighted_precision_recall()
+    overall_selection_rate = metric_frame.overall['selection_rate']
 
     print(f"\n🎯 基础模型性能:")
     print(f"准确率: {base_accuracy:.3f}")
     print(f"精确率: {base_precision:.3f}")
     print(f"召回率: {base_recall:.3f}")
 
-    # 基础模型性能
-    dp_diff = demographic_parity_difference(y_test,y_pred_base,sensitive_features=A_test)
-    eo_diff = equalized_odds_difference(y_test,y_pred_base,sensitive_features=A_test)
+    if min_group_size:
+        n_groups = len(metric_frame.labels)
+        metric_frame = metric_frame.filter(min_group_size)
+        print(f"\n🔎 已排除样本数少于 {min_group_size} 的分组: {n_groups - len(metric_frame.labels)} / {n_groups}")
+
+    # 公平性指标
+    dp_diff = metric_frame.demographic_parity_difference()
+    eo_diff = metric_frame.equalized_odds_difference()
 
     print(f"\n⚖️ 公平性指标:")
     print(f"统计均等差异: {dp_diff:.3f} (越接近0越公平)")
     print(f"均等几率差异: {eo_diff:.3f} (越接近0越公平)")
 
-    metrics = {
-        'accuracy': accuracy_score,
-        'precision': lambda y_true, y_pred: precision_score(y_true, y_pred, average='binary'),
-        'recall': lambda y_true, y_pred: recall_score(y_true, y_pred, average='binary'),
-        'selection_rate': selection_rate,
-        'count': count,
-    }
-
-    metric_frame = MetricFrame(
-        metrics=metrics,
-        y_true=y_test,
-        y_pred=y_pred_base,
-        sensitive_features=A_test,
-    )
+    # 自助法置信区间：只需分组计数，与样本行数无关
+    fairness_ci = None
+    if bootstrap and len(metric_frame.labels) > 0:
+        with stage('bootstrap'):
+            fairness_ci = bootstrap_fairness_ci(metric_frame.counts, n_resamples=bootstrap,
+                                                random_state=random_state, n_jobs=n_jobs)
+        dp_low, dp_high = fairness_ci['demographic_parity_diff']
+        eo_low, eo_high = fairness_ci['equalized_odds_diff']
+        print(f"\n📏 95% 置信区间（自助法 {bootstrap} 次重采样）:")
+        print(f"统计均等差异: [{dp_low:.3f}, {dp_high:.3f}]")
+        print(f"均等几率差异: [{eo_low:.3f}, {eo_high:.3f}]")
 
-    print(f"\n📋 按 [{sensitive_feature}] 分组的详细指标:")
+    group_name = sensitive_feature if isinstance(sensitive_feature, str) else ' × '.join(sensitive_feature)
+    print(f"\n📋 按 [{group_name}] 分组的详细指标:")
     print(metric_frame.by_group.round(3))
 
     # 偏差分析
     print(f"\n📈 偏差分析:")
-    overall_selection_rate = metric_frame.overall['selection_rate']
     group_selection_rate = metric_frame.by_group['selection_rate']
+    if len(group_selection_rate) > 20:
+        # 交叉分组较多时只列出偏差最大的 20 组
+        print(f"  （共 {len(group_selection_rate)} 组，仅显示偏差最大的 20 组）")
+        biggest = (group_selection_rate - overall_selection_rate).abs().nlargest(20).index
+        group_selection_rate = group_selection_rate[biggest]
 
     for group,rate in group_selection_rate.items():
         bias = rate - overall_selection_rate
         print(f"  {group}: 选择率 = {rate:.3f}, 偏差 = {bias:+.3f}")
 
     return {
-        'model': base_model,
-        'X_test': X_test,
-        'y_test': y_test,
-        'A_test': A_test,
-        'y_pred_base': y_pred_base,
+        'y_test': y_true,
+        'A_test': A,
+        'y_pred_base': y_pred,
         'metrics': metric_frame,
         'fairness_metrics': {
             'demographic_parity_diff':dp_diff,
             'equalized_odds_diff':eo_diff,
         },
+        'fairness_ci': fairness_ci,
         'base_accuracy': base_accuracy,
         'base_precision': base_precision,
         'base_recall': base_recall
 
     }
 
+
+def evaluate_predictions(df, sensitive_feature, target_column, prediction_column, score_column=None,
+                         min_group_size=None, bootstrap=0, n_jobs=None):
+    """模型评估模式：直接使用已有的预测列计算公平性指标，不训练模型"""
+    print(f"\n📊 模型评估模式: 使用预测列 [{prediction_column}]，跳过模型训练")
+    print(f"评估样本: {len(df)}")
+
+    results = fairness_report(df[target_column], df[prediction_column], df[sensitive_feature], sensitive_feature,
+                              min_group_size=min_group_size, bootstrap=bootstrap, n_jobs=n_jobs,
+                              category_mappings=df.attrs.get('category_mappings'))
+    results.update({
+        'model': None,
+        'X_test': None,
+        'y_score': df[score_column] if score_column else None,
+    })
+    return results
+
+
+_CSV_TRUE = ('True', 'TRUE', 'true')
+_CSV_FALSE = ('False', 'FALSE', 'false')
+
+
+def _reads_text(chunks):
+    # load_data 分块读取 CSV 时各列都按文本读取（见 load_data）
+    from pandas.io.parsers import TextFileReader
+    return isinstance(chunks, TextFileReader)
+
+
+def _parse_text_labels(values, has_missing):
+    """按整表 pd.read_csv 的推断规则确定文本列的类型，返回 ({原始文本: 取值}, 是否按标签编码)
+    全部是数字时为数值列（有缺失值的整数列读作浮点数），全部是 True/False 时为布尔列，否则为字符串列"""
+    text = pd.Series(list(values), dtype=object)
+    if len(text) and text.isin(_CSV_TRUE + _CSV_FALSE).all():
+        # 有缺失值的布尔列整表读取时是对象列，由 data_preprocessing 按标签编码
+        return dict(zip(text, text.isin(_CSV_TRUE))), has_missing
+    numbers = pd.to_numeric(text, errors='coerce')
+    if numbers.notna().all():
+        if has_missing:
+            numbers = numbers.astype(np.float64)
+        return dict(zip(text, numbers.tolist())), False
+    return dict(zip(text, text)), True
+
+
+class _StreamColumn:
+    """分块读取时的一个标签列：各块按取值编码，不依赖每块单独推断出的类型；读完后再确定整列的类型
+
+    text=True 表示各块按文本读取（CSV），此时记录清洗前出现过的全部取值，结束时按整表读取的规则推断类型。
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.codes = {}  # 取值 -> 编码（按清洗后首次出现的顺序，与 pd.factorize 一致）
+        self.seen = set()
+        self.has_missing = False
+        self.is_label = False
+
+    def factorize(self, values):
+        """块内编码 (codes, uniques)，缺失值为 -1；同时记录删除缺失行之前的取值（整表读取时据此推断类型）"""
+        codes, uniques = pd.factorize(values)
+        if self.text:
+            self.has_missing = self.has_missing or bool((codes < 0).any())
+            self.seen.update(uniques)
+        elif _is_label_column(values):
+            self.is_label = True
+        return codes, uniques
+
+    def encode(self, codes, uniques):
+        """块内编码（已删除缺失行）-> 全局编码，新取值按块内首次出现的顺序追加"""
+        lookup = np.full(len(uniques), -1, dtype=np.int64)
+        for local in pd.unique(codes):
+            lookup[local] = self.codes.setdefault(uniques[local], len(self.codes))
+        return lookup[codes]
+
+    def resolve(self):
+        """(按编码顺序排列的取值, 是否按标签编码)；数值列的取值转为整表读取时的数值"""
+        raw = list(self.codes)
+        if not self.text:
+            return raw, self.is_label
+        typed, is_label = _parse_text_labels(self.seen, self.has_missing)
+        return [typed[value] for value in raw], is_label
+
+
+def _encode_columns(chunk, columns):
+    """逐列编码一块数据，返回 (无缺失值的行, 这些行各列的全局编码)；每列只做一次哈希"""
+    local = {col: column.factorize(chunk[col]) for col, column in columns.items()}
+    keep = np.logical_and.reduce([codes >= 0 for codes, _ in local.values()])
+    return keep, tuple(columns[col].encode(codes[keep], uniques) for col, (codes, uniques) in local.items())
+
+
+def _positive_flags(target, prediction):
+    """每个目标值编码 / 预测值编码是否为正类，规则与 data_preprocessing + pos_label=1 一致：
+    标签列编码为 1（第二个出现的标签）的是正类，预测列与目标列都是标签列时沿用目标列的编码，数值列取值为 1 的是正类"""
+    target_values, target_is_label = target.resolve()
+    prediction_values, prediction_is_label = prediction.resolve()
+    if target_is_label:
+        y_true = np.arange(len(target_values)) == 1
+    else:
+        y_true = np.array([value == 1 for value in target_values], dtype=bool)
+    if prediction_is_label and target_is_label:
+        positive = target_values[1:2]
+        y_pred = np.array([value in positive for value in prediction_values], dtype=bool)
+    elif prediction_is_label:
+        y_pred = np.arange(len(prediction_values)) == 1
+    else:
+        y_pred = np.array([value == 1 for value in prediction_values], dtype=bool)
+    return y_true, y_pred
+
+
+def streaming_evaluation(chunks, sensitive_feature, target_column, prediction_column, min_group_size=None,
+                         bootstrap=0, n_jobs=None):
+    """分块流式的模型评估：逐块清洗并按取值累加 分组 × 目标值 × 预测值 的联合计数，内存占用与文件大小无关
+    min_group_size / bootstrap 与整表评估（evaluate_predictions）含义相同
+
+    每块单独推断的类型可能不一致（CSV 同一列一块读成数字、另一块读成字符串），因此各列的类型、正类与分组顺序
+    都在读完后确定，结果与整表载入 + data_preprocessing 一致。
+    """
+    required_columns = [sensitive_feature, target_column, prediction_column]
+    text = _reads_text(chunks)
+    columns = {col: _StreamColumn(text) for col in required_columns}
+    joint = np.zeros((0, 0, 0), dtype=np.int64)
+    total_rows = 0
+    clean_rows = 0
+
+    # 读取与计数交替进行，整个分块循环记为一个阶段
+    with stage('stream'):
+        for chunk in chunks:
+            missing_columns = [col for col in required_columns if col not in chunk.columns]
+            if missing_columns:
+                print(f"❌ 列不存在: {missing_columns}")
+                return None
+            total_rows += len(chunk)
+            keep, codes = _encode_columns(chunk, columns)
+            clean_rows += int(keep.sum())
+            shape = tuple(len(columns[col].codes) for col in required_columns)
+            if joint.shape != shape:
+                joint = np.pad(joint, [(0, new - old) for new, old in zip(shape, joint.shape)])
+            joint += np.bincount(np.ravel_multi_index(codes, shape), minlength=joint.size).reshape(shape)
+
+    print(f"\n📊 分块模型评估: 使用预测列 [{prediction_column}]，跳过模型训练")
+    print(f"数据清理: {total_rows} -> {clean_rows} 行")
+    if clean_rows == 0:
+        print("警告: 清理后没有数据了")
+        return None
+
+    # 联合计数按各编码是否为正类折叠成每组的 TN/FP/FN/TP
+    y_true, y_pred = _positive_flags(columns[target_column], columns[prediction_column])
+    outcome = y_true[:, None] * 2 + y_pred[None, :]
+    counts = np.stack([joint[:, outcome == k].sum(axis=1) for k in (TN, FP, FN, TP)], axis=1)
+    # 标签列的分组按首次出现顺序排列，数值列按取值排序，与整表计算一致
+    groups, groups_are_labels = columns[sensitive_feature].resolve()
+    order = np.arange(len(groups)) if groups_are_labels else np.argsort(np.asarray(groups), kind='stable')
+    labels = pd.Index([groups[i] for i in order], name=sensitive_feature)
+    results = fairness_report(None, None, None, sensitive_feature,
+                              metric_frame=GroupMetrics(counts[order], labels, name=sensitive_feature),
+                              min_group_size=min_group_size, bootstrap=bootstrap, n_jobs=n_jobs)
+    results.update({
+        'model': None,
+        'X_test': None,
+        'y_score': None,
+    })
+    return results
+
+
+def approximate_evaluation(chunks, sensitive_feature, target_column, prediction_column, per_stratum=1000,
+                           random_state=42, fairness_bound=None):
+    """近似扫描：单次遍历按 敏感特征 × 目标值 分层蓄水池抽样，在样本上估计分组指标并给出 95% 误差界
+    每层至多保留 per_stratum 行，小分组不会因为大分组而抽不到样本；
+    fairness_bound 给定时，差异与该阈值的距离落在误差界内则提示改用精确扫描"""
+    from sampling import Z_95, StratifiedReservoir, disparity_bounds, stratified_estimates
+
+    # 已载入的 DataFrame 视为只有一块
+    category_mappings = None
+    if isinstance(chunks, pd.DataFrame):
+        category_mappings = chunks.attrs.get('category_mappings')
+        chunks = [chunks]
+    required_columns = [sensitive_feature, target_column, prediction_column]
+    reservoir = StratifiedReservoir(per_stratum, random_state=random_state)
+    text = _reads_text(chunks)
+    columns = {col: _StreamColumn(text) for col in required_columns}
+    total_rows = 0
+
+    with stage('sample'):
+        for chunk in chunks:
+            missing_columns = [col for col in required_columns if col not in chunk.columns]
+            if missing_columns:
+                print(f"❌ 列不存在: {missing_columns}")
+                return None
+            total_rows += len(chunk)
+            # 标签按全文件首次出现顺序编码，与 data_preprocessing / 流式评估一致
+            keep, _ = _encode_columns(chunk, columns)
+            reservoir.update(chunk[required_columns][keep], [sensitive_feature, target_column])
+
+    keys, population, _ = reservoir.strata()
+    clean_rows = int(population.sum())
+    print(f"\n📊 近似扫描: 使用预测列 [{prediction_column}]，按 [{sensitive_feature}] × [{target_column}] 分层抽样")
+    print(f"数据清理: {total_rows} -> {clean_rows} 行")
+    if clean_rows == 0:
+        print("警告: 清理后没有数据了")
+        return None
+
+    # 各列的类型与正类在读完后确定（CSV 分块按文本读取，数值列在这里转回数值）
+    flags = dict(zip((target_column, prediction_column),
+                     _positive_flags(columns[target_column], columns[prediction_column])))
+    groups, _ = columns[sensitive_feature].resolve()
+    group_values = dict(zip(columns[sensitive_feature].codes, groups))
+
+    def encode(values, column):
+        # 类别列先转成普通对象列再查编码
+        codes = pd.Series(values).astype(object).map(columns[column].codes).to_numpy(dtype=np.int64)
+        return flags[column][codes].astype(np.int64)
+
+    def group_of(values):
+        return pd.Series(values).astype(object).map(group_values)
+
+    # 分层键 -> (分组, 是否正类)，各层的总行数汇总为形状 (n_groups, 2) 的数组
+    strata = pd.DataFrame(keys, columns=[sensitive_feature, target_column])
+    strata_groups = group_of(strata[sensitive_feature])
+    labels = pd.Index(pd.unique(strata_groups), name=sensitive_feature).sort_values()
+    group_population = np.zeros((len(labels), 2), dtype=np.int64)
+    np.add.at(group_population, (labels.get_indexer(strata_groups), encode(strata[target_column], target_column)),
+              population)
+
+    sample = reservoir.sample
+    with stage('metrics'):
+        counts, errors = stratified_estimates(labels.get_indexer(group_of(sample[sensitive_feature])),
+                                              encode(sample[target_column], target_column),
+                                              encode(sample[prediction_column], prediction_column),
+                                              len(labels), group_population)
+    labels = restore_labels(labels, category_mappings)
+    results = fairness_report(None, None, None, sensitive_feature,
+                              metric_frame=GroupMetrics(counts, labels, name=sensitive_feature))
+
+    bounds = disparity_bounds(counts, errors)
+    group_bounds = (errors.drop(columns='sampled') * Z_95).set_axis(labels)
+    print(f"\n📏 95% 误差界（分层样本 {len(sample)} / {clean_rows} 行，每层至多 {per_stratum} 行）:")
+    for key, name in (('demographic_parity_diff', '统计均等差异'), ('equalized_odds_diff', '均等几率差异')):
+        estimate = results['fairness_metrics'][key]
+        print(f"{name}: {estimate:.3f} ± {bounds[key]:.3f}")
+        if fairness_bound is not None and abs(estimate - fairness_bound) <= bounds[key]:
+            print(f"  ⚠️ 与阈值 {fairness_bound} 的距离在误差范围内，建议运行精确扫描确认")
+    # 各组估计值与误差界并排显示
+    rates = rates_from_counts(counts)
+    table = pd.DataFrame({col: [f"{rate:.3f} ± {bound:.3f}" for rate, bound in zip(rates[col], group_bounds[col])]
+                          for col in group_bounds.columns}, index=labels)
+    table['sampled'] = errors['sampled'].to_numpy()
+    table['count'] = results['metrics'].by_group['count']
+    print(table.to_string())
+
+    results.update({
+        'model': None,
+        'X_test': None,
+        'y_score': None,
+        'sample_size': len(sample),
+        'population': clean_rows,
+        'error_bounds': dict(bounds, by_group=group_bounds),
+    })
+    return results
+
+
+ESTIMATOR_CHOICES = ('random_forest', 'hist_gradient_boosting', 'logistic_regression')
+
+
+def warm_imports():
+    """预先导入训练路径用到的重模块；gunicorn preload 时在 master 中调用，fork 出的 worker 直接共享"""
+    import sklearn.ensemble
+    import sklearn.linear_model
+    import sklearn.model_selection
+    import sklearn.pipeline
+    import sklearn.preprocessing
+    import threadpoolctl
+
+
+def build_estimator(estimator='random_forest', n_jobs=None, random_state=42, **params):
+    """按名称构造基础模型，params 覆盖默认超参数；也可以直接传入 sklearn 估计器实例"""
+    if not isinstance(estimator, str):
+        return estimator
+    name = estimator.lower()
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        params.setdefault('n_estimators', 100)
+        return RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **params)
+    if name == 'hist_gradient_boosting':
+        # 多线程由 OpenMP 控制，线程数在 fit 时通过 threadpool_limits 限制
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        return HistGradientBoostingClassifier(random_state=random_state, **params)
+    if name == 'logistic_regression':
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        params.setdefault('max_iter', 1000)
+        return make_pipeline(StandardScaler(), LogisticRegression(random_state=random_state, **params))
+    raise ValueError(f"不支持的模型: {estimator}，可选: {', '.join(ESTIMATOR_CHOICES)}")
+
+
+def fit_estimator(model, X_train, y_train, n_jobs=None):
+    """训练模型；n_jobs 同时限制 BLAS/OpenMP 线程数，保证多进程部署时不会超额占用 CPU"""
+    if n_jobs is None:
+        return model.fit(X_train, y_train)
+    from threadpoolctl import threadpool_limits
+    with threadpool_limits(limits=resolve_n_jobs(n_jobs)):
+        return model.fit(X_train, y_train)
+
+
+def split_data(df, sensitive_columns, target_column, features, random_state=42):
+    """划分训练/测试集，返回 (X_train, X_test, y_train, y_test, A_train, A_test)；敏感特征为 DataFrame"""
+    # sklearn 只在训练路径上导入，评估模式与 Web 启动不为此付出导入开销
+    from sklearn.model_selection import train_test_split
+
+    # 只划分行号，再按行号分别取各部分，不复制整张表（划分结果与直接划分 DataFrame 相同）
+    with stage('split'):
+        train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.3, random_state=random_state,
+                                               stratify=df[target_column])
+        # 敏感特征同时作为模型特征时也只取一份，测试集中的敏感特征始终是一维的
+        sensitive = df[list(dict.fromkeys(sensitive_columns))]
+        # 按列表选列会复制所选列，特征列只选一次，训练集与测试集都从这一份中取行
+        X = df[features]
+        y = df[target_column]
+        return (X.take(train_idx), X.take(test_idx),
+                y.take(train_idx), y.take(test_idx),
+                sensitive.take(train_idx), sensitive.take(test_idx))
+
+
+def train_and_predict(df, sensitive_columns, target_column, features, estimator='random_forest', n_jobs=None,
+                      random_state=42, split=None, artifacts=None):
+    """划分训练/测试集、训练模型并预测，返回 (模型, X_test, y_test, 测试集敏感特征 DataFrame, 预测值)
+    split 为 split_data 的结果，传入时直接复用，不再重新划分；
+    artifacts 为 ArtifactStore，训练数据、特征、目标、模型与随机种子都相同时直接载入已保存的模型与预测值"""
+    if split is None:
+        split = split_data(df, sensitive_columns, target_column, features, random_state)
+    X_train, X_test, y_train, y_test, _, A_test = split
+
+    print(f"\n📊 数据分割:")
+    print(f"训练集: {X_train.shape[0]} 样本")
+    print(f"测试集: {X_test.shape[0]} 样本")
+
+    key = None
+    if artifacts is not None:
+        from artifact_store import model_key
+        with stage('artifact_lookup'):
+            key = model_key(df, features, target_column, estimator, random_state)
+            cached = artifacts.get(key)
+        # 划分只由数据、目标列与随机种子决定，键相同时测试集与保存时一致
+        if cached is not None and len(cached['y_pred']) == len(X_test):
+            print(f"\n♻️ 载入已保存的模型与预测值（{type(cached['model']).__name__}），跳过训练")
+            return cached['model'], X_test, y_test, A_test, cached['y_pred']
+
+    # 训练基础模型
+    base_model = build_estimator(estimator, n_jobs=n_jobs, random_state=random_state)
+    print(f"\n🤖 训练基础模型: {type(base_model).__name__} (n_jobs={n_jobs}, random_state={random_state})...")
+    with stage('fit'):
+        fit_estimator(base_model, X_train, y_train, n_jobs=n_jobs)
+    with stage('predict'):
+        y_pred_base = base_model.predict(X_test)
+    if key is not None:
+        with stage('artifact_save'):
+            artifacts.put(key, base_model, meta={'features': list(features), 'target': target_column,
+                                                 'random_state': random_state, 'train_rows': len(X_train)},
+                          y_pred=y_pred_base)
+    return base_model, X_test, y_test, A_test, y_pred_base
+
+
+def fairlearn_analysis(df,sensitive_feature,target_column,features,prediction_column=None,score_column=None,
+                       estimator='random_forest',n_jobs=None,random_state=42,min_group_size=None,bootstrap=0,
+                       mitigate=False,grid_size=20,mitigation_budget=None,threshold_constraint=None,
+                       fairness_bound=0.05,sample_per_stratum=None,cv_folds=None,artifacts=None):
+    """sensitive_feature 传入列名列表时做交叉分组分析（如 性别 × 地区 × 年龄段）
+    bootstrap 为置信区间的重采样次数，0 表示不计算；
+    mitigate=True 时在同一划分上运行 GridSearch 偏差缓解（grid_size 个候选点，mitigation_budget 秒的计算预算）；
+    threshold_constraint 为 'demographic_parity' 或 'equalized_odds' 时做阈值分析（需要得分列或支持
+    predict_proba 的模型），给出各组 ROC 曲线以及差异不超过 fairness_bound 的分组阈值；
+    sample_per_stratum 给定时（模型评估模式）做近似扫描：按 敏感特征 × 目标值 分层抽样，报告估计值与误差界；
+    cv_folds 给定时以 k 折交叉验证代替单次划分，各折并行训练，所有样本都参与评估；
+    artifacts 为 ArtifactStore 时复用已保存的模型与预测值（只换敏感特征或指标设置时不再训练）"""
+    intersectional = not isinstance(sensitive_feature, str)
+    if intersectional:
+        sensitive_feature = list(sensitive_feature)
+
+    if prediction_column and sample_per_stratum:
+        if intersectional:
+            raise ValueError("近似扫描暂只支持单个敏感特征")
+        return approximate_evaluation(df, sensitive_feature, target_column, prediction_column, sample_per_stratum,
+                                      random_state=random_state, fairness_bound=fairness_bound)
+
+    # 分块 reader（load_data(chunksize=...) 的返回值）走流式评估
+    if prediction_column and not isinstance(df, pd.DataFrame):
+        if intersectional:
+            raise ValueError("分块评估暂只支持单个敏感特征")
+        return streaming_evaluation(df, sensitive_feature, target_column, prediction_column,
+                                    min_group_size=min_group_size, bootstrap=bootstrap, n_jobs=n_jobs)
+
+    # 已有预测列时直接进入指标计算
+    if prediction_column:
+        results = evaluate_predictions(df, sensitive_feature, target_column, prediction_column, score_column,
+                                       min_group_size=min_group_size, bootstrap=bootstrap, n_jobs=n_jobs)
+        if threshold_constraint:
+            if results['y_score'] is None:
+                print("⚠️ 阈值分析需要得分列，已跳过")
+            else:
+                results['thresholds'] = threshold_report(
+                    df[target_column], results['y_score'], df[sensitive_feature], threshold_constraint,
+                    fairness_bound, category_mappings=df.attrs.get('category_mappings'))
+        return results
+
+    if cv_folds:
+        if mitigate or threshold_constraint:
+            print("⚠️ 交叉验证模式暂不支持偏差缓解与阈值分析，已跳过")
+        return cross_validated_analysis(df, sensitive_feature, target_column, features, cv_folds, estimator, n_jobs,
+                                        random_state, min_group_size=min_group_size, bootstrap=bootstrap)
+
+    split = split_data(df, sensitive_feature if intersectional else [sensitive_feature], target_column, features,
+                       random_state)
+    base_model, X_test, y_test, A_test, y_pred_base = train_and_predict(
+        df, None, target_column, features, estimator, n_jobs, random_state, split=split, artifacts=artifacts)
+    if not intersectional:
+        A_test = A_test[sensitive_feature]
+        print(f"敏感特征分布:")
+        print(A_test.value_counts())
+
+    results = fairness_report(y_test, y_pred_base, A_test, sensitive_feature, min_group_size=min_group_size,
+                              bootstrap=bootstrap, n_jobs=n_jobs, random_state=random_state,
+                              category_mappings=df.attrs.get('category_mappings'))
+    results.update({
+        'model': base_model,
+        'X_test': X_test,
+    })
+    if threshold_constraint:
+        y_score = positive_scores(base_model, X_test)
+        if y_score is None:
+            print("⚠️ 当前模型不输出概率，已跳过阈值分析")
+        else:
+            results['y_score'] = y_score
+            results['thresholds'] = threshold_report(y_test, y_score, A_test, threshold_constraint, fairness_bound,
+                                                     category_mappings=df.attrs.get('category_mappings'))
+    if mitigate:
+        results['mitigation'] = mitigation_report(split, estimator, n_jobs, random_state, grid_size,
+                                                  mitigation_budget, results)
+    return results
+
+
+def positive_scores(model, X):
+    """正类（编码为 1）的预测概率，只调用一次 predict_proba；模型不支持时返回 None"""
+    if not hasattr(model, 'predict_proba') or 1 not in list(model.classes_):
+        return None
+    with stage('predict_proba'):
+        return model.predict_proba(X)[:, list(model.classes_).index(1)]
+
+
+def threshold_report(y_true, y_score, A, constraint='demographic_parity', bound=0.05, category_mappings=None):
+    """阈值分析：一次排序得到各组全部阈值下的计数，打印 AUC、统一阈值扫描与满足约束的分组阈值"""
+    with stage('thresholds'):
+        curves = compute_threshold_curves(y_true, y_score, A)
+        if category_mappings:
+            curves = curves.relabel(category_mappings)
+        auc = curves.auc()
+        sweep = curves.at(np.round(np.linspace(0.1, 0.9, 9), 2))
+        best = curves.best_thresholds(constraint, bound)
+
+    print(f"\n📐 阈值分析（得分 >= 阈值判为正类）:")
+    print("各组 ROC 曲线下面积:")
+    print(auc.round(3).to_string())
+    print("\n统一阈值下的准确率与差异:")
+    print(sweep.round(3).to_string())
+    constraint_name = '统计均等差异' if constraint == 'demographic_parity' else '均等几率差异'
+    status = '✅' if best['feasible'] else '⚠️ 无法满足约束，以下为差异最小的组合'
+    print(f"\n🎚️ 分组阈值（{constraint_name} <= {bound}）{status}:")
+    print(best['by_group'].round(3).to_string())
+    print(f"准确率: {best['accuracy']:.3f}，统计均等差异: {best['demographic_parity_diff']:.3f}，"
+          f"均等几率差异: {best['equalized_odds_diff']:.3f}")
+    return {
+        'curves': curves,
+        'auc': auc,
+        'sweep': sweep,
+        'best': best,
+    }
+
+
+def mitigation_report(split, estimator, n_jobs, random_state, grid_size, time_budget, base_results):
+    """在已划分的训练/测试集上运行 GridSearch 偏差缓解，并打印各候选的准确率与差异的权衡"""
+    from mitigation import grid_search_mitigation
+
+    X_train, X_test, y_train, y_test, A_train, A_test = split
+    print(f"\n🛠️ 偏差缓解: GridSearch + DemographicParity（{grid_size} 个候选点，n_jobs={n_jobs}）...")
+    with stage('mitigation'):
+        mitigation = grid_search_mitigation(build_estimator(estimator, n_jobs=1, random_state=random_state),
+                                            X_train, y_train, A_train, X_test, y_test, A_test,
+                                            grid_size=grid_size, n_jobs=n_jobs, time_budget=time_budget)
+
+    print(f"已评估 {mitigation['evaluated']} / {mitigation['grid_size']} 个候选点，"
+          f"耗时 {mitigation['elapsed_seconds']:.1f}s")
+    print("\n📉 准确率与统计均等差异的权衡（测试集）:")
+    print(mitigation['candidates'].sort_values('demographic_parity_diff').round(3).to_string())
+    best = mitigation['candidates'].loc[mitigation['best_grid_point']]
+    print(f"\n✅ 选中候选 {mitigation['best_grid_point']}: "
+          f"准确率 {best['accuracy']:.3f}（基础模型 {base_results['base_accuracy']:.3f}），"
+          f"统计均等差异 {best['demographic_parity_diff']:.3f}"
+          f"（基础模型 {base_results['fairness_metrics']['demographic_parity_diff']:.3f}）")
+    return mitigation
+
+
+def cross_validated_analysis(df, sensitive_feature, target_column, features, n_splits=5, estimator='random_forest',
+                             n_jobs=None, random_state=42, min_group_size=None, bootstrap=0):
+    """k 折交叉验证模式：各折并行训练，每一行都得到样本外预测；报告汇总的分组指标以及各折之间的波动"""
+    from cross_validation import cross_validated_predictions, cross_validation_summary
+
+    category_mappings = df.attrs.get('category_mappings')
+    y_true = df[target_column]
+    A = df[sensitive_feature]
+    print(f"\n🔁 {n_splits} 折交叉验证: {len(df)} 样本全部由未见过它们的模型预测（n_jobs={n_jobs}）")
+    with stage('cross_validation'):
+        y_pred, fold_ids, fit_seconds = cross_validated_predictions(
+            build_estimator(estimator, n_jobs=1, random_state=random_state), df[features], y_true,
+            n_splits=n_splits, n_jobs=n_jobs, random_state=random_state)
+    print(f"各折训练耗时: {', '.join(f'{seconds:.1f}s' for seconds in fit_seconds)}")
+
+    with stage('metrics'):
+        cv = cross_validation_summary(y_true, y_pred, fold_ids, A, n_splits, min_group_size=min_group_size)
+    results = fairness_report(y_true, y_pred, A, sensitive_feature, metric_frame=cv['pooled'],
+                              min_group_size=min_group_size, bootstrap=bootstrap, n_jobs=n_jobs,
+                              random_state=random_state, category_mappings=category_mappings)
+
+    folds = cv['folds']
+    print(f"\n📐 各折的公平性差异:")
+    print(folds.round(3).to_string())
+    for key, name in (('demographic_parity_diff', '统计均等差异'), ('equalized_odds_diff', '均等几率差异')):
+        print(f"{name}: 均值 {folds[key].mean():.3f}，标准差 {folds[key].std():.3f}，"
+              f"范围 [{folds[key].min():.3f}, {folds[key].max():.3f}]")
+    group_spread = cv['group_spread'].set_axis(restore_labels(cv['group_spread'].index, category_mappings))
+    print(f"\n📋 各组比率在各折之间的波动:")
+    shown = group_spread
+    if len(shown) > 20:
+        # 分组较多时只列出选择率波动最大的 20 组
+        print(f"  （共 {len(shown)} 组，仅显示选择率波动最大的 20 组）")
+        shown = shown.loc[shown[('selection_rate', 'std')].nlargest(20).index]
+    print(shown.round(3).to_string())
+
+    results.update({
+        'model': None,
+        'X_test': df[features],
+        'fold_ids': fold_ids,
+        'cross_validation': dict(cv, group_spread=group_spread, fit_seconds=fit_seconds),
+    })
+    return results
+
+
+def multi_attribute_report(y_true, y_pred, A, category_mappings=None, bootstrap=0, n_jobs=None, random_state=42):
+    """多个敏感特征的合并报告：共用同一份预测，一次计数得到每个敏感特征的分组指标
+    bootstrap > 0 时由各敏感特征自己的分组计数分别给出 DP / EO 差异的 95% 置信区间"""
+    with stage('metrics'):
+        metrics = compute_multi_group_metrics(y_true, y_pred, A)
+    if category_mappings:
+        metrics = {name: group_metrics.relabel(category_mappings) for name, group_metrics in metrics.items()}
+    overall = next(iter(metrics.values()))
+    base_accuracy = overall.overall['accuracy']
+    base_precision, base_recall = overall.weighted_precision_recall()
+
+    print("\n" + "=" * 60)
+    print("📊 FAIRLEARN 多敏感特征公平性分析报告")
+    print("=" * 60)
+    print(f"\n🎯 基础模型性能:")
+    print(f"准确率: {base_accuracy:.3f}")
+    print(f"精确率: {base_precision:.3f}")
+    print(f"召回率: {base_recall:.3f}")
+
+    fairness_summary = pd.DataFrame({
+        name: {
+            'demographic_parity_diff': group_metrics.demographic_parity_difference(),
+            'equalized_odds_diff': group_metrics.equalized_odds_difference(),
+        }
+        for name, group_metrics in metrics.items()
+    }).T
+    fairness_summary.index.name = 'sensitive_feature'
+    print(f"\n⚖️ 各敏感特征的公平性指标 (越接近0越公平):")
+    print(fairness_summary.round(3))
+
+    # 各敏感特征的差异来自不同的分组方式，置信区间逐个计算，不合并成一个区间
+    fairness_ci = None
+    if bootstrap:
+        with stage('bootstrap'):
+            by_attribute = {
+                name: bootstrap_fairness_ci(group_metrics.counts, n_resamples=bootstrap,
+                                            random_state=random_state, n_jobs=n_jobs)
+                for name, group_metrics in metrics.items() if len(group_metrics.labels) > 0
+            }
+        fairness_ci = {
+            'n_resamples': bootstrap,
+            'confidence': 0.95,
+            'by_attribute': {name: {key: ci[key] for key in ('demographic_parity_diff', 'equalized_odds_diff')}
+                             for name, ci in by_attribute.items()},
+        }
+        print(f"\n📏 95% 置信区间（自助法 {bootstrap} 次重采样）:")
+        for name, ci in fairness_ci['by_attribute'].items():
+            dp_low, dp_high = ci['demographic_parity_diff']
+            eo_low, eo_high = ci['equalized_odds_diff']
+            print(f"  {name}: 统计均等差异 [{dp_low:.3f}, {dp_high:.3f}]，均等几率差异 [{eo_low:.3f}, {eo_high:.3f}]")
+
+    by_group = pd.concat({name: group_metrics.by_group for name, group_metrics in metrics.items()},
+                         names=['sensitive_feature', 'group'])
+    print(f"\n📋 按敏感特征分组的详细指标:")
+    print(by_group.round(3))
+
+    return {
+        'y_test': y_true,
+        'A_test': A,
+        'y_pred_base': y_pred,
+        'metrics': metrics,
+        'by_group': by_group,
+        'fairness_summary': fairness_summary,
+        # 汇总值取所有敏感特征中的最大差异
+        'fairness_metrics': fairness_summary.max().to_dict(),
+        'fairness_ci': fairness_ci,
+        'base_accuracy': base_accuracy,
+        'base_precision': base_precision,
+        'base_recall': base_recall
+    }
+
+
+def multi_attribute_analysis(df, sensitive_features, target_column, features, prediction_column=None,
+                             estimator='random_forest', n_jobs=None, random_state=42, artifacts=None, bootstrap=0):
+    """同时扫描多个敏感特征：只划分、训练、预测一次，再对每个敏感特征计算分组指标
+    bootstrap 为每个敏感特征置信区间的重采样次数，0 表示不计算"""
+    sensitive_features = list(sensitive_features)
+    if prediction_column:
+        print(f"\n📊 模型评估模式: 使用预测列 [{prediction_column}]，跳过模型训练")
+        results = multi_attribute_report(df[target_column], df[prediction_column], df[sensitive_features],
+                                         category_mappings=df.attrs.get('category_mappings'),
+                                         bootstrap=bootstrap, n_jobs=n_jobs, random_state=random_state)
+        results.update({'model': None, 'X_test': None})
+        return results
+
+    base_model, X_test, y_test, A_test, y_pred_base = train_and_predict(
+        df, sensitive_features, target_column, features, estimator, n_jobs, random_state, artifacts=artifacts)
+    results = multi_attribute_report(y_test, y_pred_base, A_test, category_mappings=df.attrs.get('category_mappings'),
+                                     bootstrap=bootstrap, n_jobs=n_jobs, random_state=random_state)
+    results.update({
+        'model': base_model,
+        'X_test': X_test,
+    })
+    return results
+
 if __name__ == '__main__':
+    configure_logging()
+    run_profile = start_profile()
     print("⚠️  注意：当前模式将训练一个新的随机森林模型用于测试")
     print("AI安全性分析工具")
     print("1.加载数据文件")
     features = []
+    prediction_column = None
+    score_column = None
+    estimator = 'random_forest'
+    intersectional = False
+    min_group_size = None
+    mitigate = False
+    mitigation_budget = None
+    threshold_constraint = None
+    sheet_name = None
+    sample_per_stratum = None
+    cv_folds = None
     use_sample = input("是否使用示例数据？（y/n）:")
     if use_sample == 'y':
         file_path = "fairlearn_data.csv"  # 或 .xlsx
         print(f"默认使用文件：{file_path}")
         file_type = "csv"  # 或 "excel"
         print(f"使用默认文件类型{file_type}")
-
-        df = load_data(file_path, file_type)
         print("\n💡 使用示例数据进行演示...")
 
         features = ['age', 'income', 'credit_score']
-        sensitive_feature = 'gender'
+        sensitive_feature = ['gender', 'region']
         target_column = 'loan_approved'
     else:
         file_path = input("请输入数据文件路径：").strip()
         file_type = input("请输入文件类型：").strip()
 
-        df = load_data(file_path, file_type)
-
         print("\n" + "=" * 50)
         print("请配置分析参数")
         print("=" * 50 )
 
-#       显示所有特征
-        all_columns = df.columns.tolist()
+#       显示所有特征（只读取表头，数据在选定列之后再加载）
+        if file_type.lower() == 'excel':
+            from excel_cache import sheet_names
+            sheets = sheet_names(file_path)
+            if len(sheets) > 1:
+                print(f"工作表：{sheets}")
+                sheet_name = input("请输入工作表名称（直接回车使用第一个，* 表示全部按行合并）：").strip() or None
+        all_columns = read_columns(file_path, file_type, sheet_name)
         print(f"数据中所有列：{all_columns}")
-#       选择特征列
-        print("\n请选择特征列(用于训练模型列)：")
-        for i,col in enumerate(all_columns,1):
-            print(f"{i}. {col}")
+#       选择分析模式
+        print("\n请选择分析模式：")
+        print("1. 训练演示模型（随机森林）")
+        print("2. 模型评估（使用数据中已有的预测列，不训练模型）")
+        mode = input("请输入模式编号（默认1）：").strip()
 
-        feature_choices=input("请输入特征列编用逗号隔开，如：1，2，3）：").strip(',')
-        features=[all_columns[int(i.strip())-1] for i in feature_choices if i.strip().isdigit()]
+        if mode == '2':
+            for i, col in enumerate(all_columns, 1):
+                print(f"  {i}. {col}")
+            prediction_idx = input("请输入预测列的编号: ").strip()
+            prediction_column = all_columns[int(prediction_idx) - 1] if prediction_idx.isdigit() else None
+            score_idx = input("请输入得分列的编号（可选，直接回车跳过）: ").strip()
+            score_column = all_columns[int(score_idx) - 1] if score_idx.isdigit() else None
+            per_stratum = input("近似扫描的每层样本数（按 敏感特征 × 目标值 分层抽样，直接回车做精确扫描）: ").strip()
+            sample_per_stratum = int(per_stratum) if per_stratum.isdigit() else None
+        else:
+#           选择特征列
+            print("\n请选择特征列(用于训练模型列)：")
+            for i,col in enumerate(all_columns,1):
+                print(f"{i}. {col}")
+
+            feature_choices=input("请输入特征列编用逗号隔开，如：1，2，3）：").strip(',')
+            features=[all_columns[int(i.strip())-1] for i in feature_choices if i.strip().isdigit()]
+
+            print("\n请选择模型：")
+            for i, name in enumerate(ESTIMATOR_CHOICES, 1):
+                print(f"{i}. {name}")
+            estimator_idx = input("请输入模型编号（默认1）：").strip()
+            if estimator_idx.isdigit() and 1 <= int(estimator_idx) <= len(ESTIMATOR_CHOICES):
+                estimator = ESTIMATOR_CHOICES[int(estimator_idx) - 1]
+            folds = input("交叉验证折数（各折并行训练，所有样本都参与评估；直接回车使用单次 70/30 划分）: ").strip()
+            cv_folds = int(folds) if folds.isdigit() and int(folds) > 1 else None
+            mitigate = input("是否运行 GridSearch 偏差缓解（较耗时）？(y/n，默认n): ").strip() == 'y'
+            if mitigate:
+                budget = input("偏差缓解的计算预算（秒，直接回车不限制）: ").strip()
+                mitigation_budget = float(budget) if budget.replace('.', '', 1).isdigit() else None
 
 #       选择敏感特征
         print(f"\n请输入敏感特征列 (用于公平性分析的列):")
         for i, col in enumerate(all_columns, 1):
             print(f"  {i}. {col}")
-        sensitive_idx = input("请输入1个敏感特征列的编号: ").strip()
-        sensitive_feature = all_columns[int(sensitive_idx) - 1] if sensitive_idx.isdigit() else None
+        sensitive_idx = input("请输入敏感特征列的编号（多个用逗号隔开，共用一次训练）: ").strip()
+        sensitive_features = [all_columns[int(i) - 1] for i in sensitive_idx.replace('，', ',').split(',')
+                              if i.strip().isdigit()]
+        if len(sensitive_features) > 1:
+            sensitive_feature = sensitive_features
+            intersectional = input("是否按交叉分组分析（如 性别 × 地区）？(y/n，默认n): ").strip() == 'y'
+            if intersectional:
+                min_size = input("交叉分组的最小样本数（默认 30）: ").strip()
+                min_group_size = int(min_size) if min_size.isdigit() else 30
+        else:
+            sensitive_feature = sensitive_features[0] if sensitive_features else None
 
         # 选择目标变量
         print(f"\n🎯 请选择目标变量列:")
@@ -247,15 +1043,21 @@ if __name__ == '__main__':
         target_idx = input("请输入1个目标变量列的编号: ").strip()
         target_column = all_columns[int(target_idx) - 1] if target_idx.isdigit() else None
 
+        if score_column or not prediction_column:
+            constraint_idx = input("是否做阈值分析？(1=统计均等, 2=均等几率，直接回车跳过): ").strip()
+            if constraint_idx in ('1', '2'):
+                threshold_constraint = ('demographic_parity', 'equalized_odds')[int(constraint_idx) - 1]
+
         print(f"\n🔍 调试信息:")
         print(f"features: {features} (长度: {len(features)})")
         print(f"sensitive_feature: {sensitive_feature}")
         print(f"target_column: {target_column}")
+        print(f"prediction_column: {prediction_column}")
 
         # 验证选择
-        if not features or not sensitive_feature or not target_column:
+        if (not features and not prediction_column) or not sensitive_feature or not target_column:
             print("❌ 参数选择不完整，请重新运行！")
-            print(f"  缺失的特征: {'features' if not features else ''}")
+            print(f"  缺失的特征: {'features' if not features and not prediction_column else ''}")
             print(f"  缺失的敏感特征: {'sensitive_feature' if not sensitive_feature else ''}")
             print(f"  缺失的目标变量: {'target_column' if not target_column else ''}")
             exit()
@@ -264,31 +1066,94 @@ if __name__ == '__main__':
     print(f"特征列: {features}")
     print(f"敏感特征: {sensitive_feature}")
     print(f"目标变量: {target_column}")
+    if prediction_column:
+        print(f"预测列: {prediction_column}（模型评估模式）")
 
+    # 单个敏感特征的模型评估分块流式处理（近似扫描时分块抽样），不载入整个文件也不做预处理；
+    # Excel 无法分块，近似扫描时整表载入后抽样；阈值分析需要整列得分，仍走整表载入
+    streaming = can_stream(file_type, sensitive_feature)
+    if isinstance(sensitive_feature, str) and (sample_per_stratum or (
+            streaming and prediction_column and not threshold_constraint)):
+        reader = load_data(file_path, file_type, chunksize=STREAM_CHUNKSIZE if streaming else None,
+                           columns=analysis_columns(features, sensitive_feature, target_column, prediction_column),
+                           sheet_name=sheet_name)
+        if reader is None:
+            exit()
+        results = fairlearn_analysis(reader, sensitive_feature, target_column, features,
+                                     prediction_column=prediction_column, sample_per_stratum=sample_per_stratum,
+                                     min_group_size=min_group_size)
+        if results is None:
+            print("公平性分析失败")
+        elif sample_per_stratum:
+            print(f"\n🎉 近似扫描完成！结果接近阈值时请去掉近似模式重新运行")
+        else:
+            print(f"\n🎉 分析完成！")
+            print(f"📊 发现 {len(results['metrics'].labels)} 个敏感特征组")
+        print("\n⏱️ 各阶段耗时与内存:")
+        print(run_profile)
+        exit()
+
+    # 只解析分析用到的列
+    df = load_data(file_path, file_type,
+                   columns=analysis_columns(features, sensitive_feature, target_column, prediction_column, score_column),
+                   dtype=analysis_dtypes(score_column), sheet_name=sheet_name)
+    if df is None:
+        exit()
 
 
     df_clean, features_clean = data_preprocessing(
         df,
         features=features,
         sensitive_feature=sensitive_feature,  # 替换为你的敏感特征列
-        target_column=target_column  # 替换为你的目标列
+        target_column=target_column,  # 替换为你的目标列
+        prediction_column=prediction_column,
+        score_column=score_column
      )
 
 
+    # 训练过的模型与预测值保存在 FAIRNESS_ARTIFACT_DIR，换敏感特征或指标重新运行时直接载入
+    from artifact_store import ArtifactStore
+    artifacts = ArtifactStore()
+
     # 公平性分析
-    if df_clean is not None:
+    if df_clean is not None and isinstance(sensitive_feature, list) and not intersectional:
+        results = multi_attribute_analysis(
+            df_clean,
+            sensitive_features=sensitive_feature,
+            target_column=target_column,
+            features=features_clean,
+            prediction_column=prediction_column,
+            estimator=estimator,
+            n_jobs=-1,
+            artifacts=artifacts
+        )
+        print(f"\n🎉 分析完成！共扫描 {len(sensitive_feature)} 个敏感特征")
+    elif df_clean is not None:
         results = fairlearn_analysis(
             df_clean,
             sensitive_feature=sensitive_feature,
             target_column=target_column,
-            features=features_clean
+            features=features_clean,
+            prediction_column=prediction_column,
+            score_column=score_column,
+            estimator=estimator,
+            n_jobs=-1,  # 命令行独占本机，使用全部核心
+            min_group_size=min_group_size,
+            mitigate=mitigate,
+            mitigation_budget=mitigation_budget,
+            threshold_constraint=threshold_constraint,
+            cv_folds=cv_folds,
+            artifacts=artifacts
         )
         if results is not None:
             print(f"\n🎉 分析完成！")
-            print(f"📊 发现 {len(results['A_test'].unique())} 个敏感特征组")
+            print(f"📊 发现 {len(results['metrics'].labels)} 个敏感特征组")
             print(f"⚖️ 模型公平性评估完毕")
         else:
             print("公平性分析失败")
     else:
         print("数据处理失败")
 
+    print("\n⏱️ 各阶段耗时与内存:")
+    print(run_profile)
+
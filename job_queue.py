@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import default_dir, private_dir
+from uploads import save_upload
+
+# 本机队列，无需外部消息中间件；任务状态落盘，同一用户下任意 gunicorn worker 都能查询
+# 以下并发与排队上限针对每个 worker 进程：整台机器最多同时运行 WEB_CONCURRENCY × FAIRNESS_JOB_WORKERS 个任务
+DEFAULT_MAX_WORKERS = int(os.environ.get('FAIRNESS_JOB_WORKERS', 2))
+DEFAULT_MAX_PENDING = int(os.environ.get('FAIRNESS_JOB_QUEUE_SIZE', 16))
+DEFAULT_TTL_SECONDS = int(os.environ.get('FAIRNESS_JOB_TTL', 24 * 3600))
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """排队任务已达上限"""
+
+
+class JobQueue:
+    """有界的后台任务池：并发数由 max_workers 控制，排队数超过 max_pending 时拒绝新任务
+
+    上限在每个进程内计数（多个 gunicorn worker 各自独立）；任务目录默认为 FAIRNESS_JOBS_DIR
+    或临时目录下按用户区分的子目录，权限为 0700（结果以 pickle 保存）。
+    """
+
+    def __init__(self, jobs_dir=None, max_workers=DEFAULT_MAX_WORKERS,
+                 max_pending=DEFAULT_MAX_PENDING, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.jobs_dir = private_dir(jobs_dir or default_dir('FAIRNESS_JOBS_DIR', 'ai-fairness-jobs'))
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _job_dir(self, job_id):
+        # 任务 ID 来自 URL，只接受 uuid4().hex 格式，防止路径穿越
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _write_status(self, job_id, **fields):
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        status = self.status(job_id) or {'job_id': job_id}
+        status.update(fields)
+        # 原子替换，轮询方不会读到写了一半的文件
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def submit(self, func, upload, run_kwargs=None, **params):
+        """保存上传文件并排队执行 func(文件路径, **run_kwargs, **params)，立即返回任务 ID
+        params 记录在任务状态中（GET /jobs/<id> 可见）；run_kwargs 只传给 func，不写入状态（如缓存键）"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_pending:
+                raise QueueFull(f"排队任务已达上限（{self.max_workers + self.max_pending}）")
+            self._in_flight += 1
+            if self._executor is None:
+                # 首次提交时才创建线程池，fork 出来的 worker 各自拥有自己的线程
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='fairness-job')
+
+        try:
+            self.cleanup()
+            job_id = uuid.uuid4().hex
+            os.makedirs(self._job_dir(job_id))
+            data_path = os.path.join(self._job_dir(job_id), 'upload')
+            save_upload(upload, data_path)
+            self._write_status(job_id, status='queued', params=params, submitted_at=time.time())
+            self._executor.submit(self._run, job_id, func, data_path, dict(params, **(run_kwargs or {})))
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, func, data_path, params):
+        try:
+            self._write_status(job_id, status='running', started_at=time.time())
+            result = func(data_path, **params)
+            with open(os.path.join(self._job_dir(job_id), 'result.pkl'), 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._write_status(job_id, status='finished', finished_at=time.time())
+        except Exception as e:
+            logger.exception("💥 后台任务 %s 失败", job_id)
+            self._write_status(job_id, status='failed', finished_at=time.time(),
+                               error=str(e), traceback=traceback.format_exc())
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            # 上传的原始数据只在运行期间需要
+            try:
+                os.remove(data_path)
+            except FileNotFoundError:
+                pass
+
+    def status(self, job_id):
+        try:
+            with open(os.path.join(self._job_dir(job_id), 'job.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (KeyError, FileNotFoundError, ValueError):
+            return None
+
+    def result(self, job_id):
+        """已完成任务的结果；不存在或无法读取（如类已改名的旧结果）时返回 None"""
+        try:
+            with open(os.path.join(self._job_dir(job_id), 'result.pkl'), 'rb') as f:
+                return pickle.load(f)
+        except (KeyError, FileNotFoundError):
+            return None
+        except Exception:
+            logger.warning("任务 %s 的结果无法读取", job_id, exc_info=True)
+            return None
+
+    def cleanup(self):
+        """删除超过保留期限的任务目录"""
+        cutoff = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.jobs_dir):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except FileNotFoundError:
+                continue
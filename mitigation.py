@@ -0,0 +1,132 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from group_metrics import compute_group_metrics
+from parallel import resolve_n_jobs
+
+
+def _integer_grid(dim, n_units, neg_allowed, force_l1_norm):
+    """L1 范数不超过 n_units 的整数点（force_l1_norm 时最后一维补足到恰好等于 n_units），按字典序排列"""
+    points = []
+    entry = np.zeros(dim)
+
+    def accumulate(index, max_val):
+        if index == dim:
+            points.append(entry.copy())
+            return
+        if index == dim - 1 and force_l1_norm:
+            values = [-max_val, max_val] if neg_allowed[index] and max_val > 0 else [max_val]
+        else:
+            values = range(-max_val if neg_allowed[index] else 0, max_val + 1)
+        for value in values:
+            entry[index] = value
+            accumulate(index + 1, max_val - abs(value))
+
+    accumulate(0, n_units)
+    return points
+
+
+def _lambda_grid(grid_size, grid_limit, pos_basis, neg_basis, neg_allowed, force_l1_norm):
+    """拉格朗日乘子网格：取前 grid_size 个整数点缩放到 grid_limit，再由基向量换算为乘子
+
+    与 fairlearn 0.8 的内部实现 _GridGenerator（MIT 许可）逐点一致；该类不是公开接口，不直接导入。
+    """
+    dim = len(pos_basis.columns)
+    neg_allowed = np.asarray(neg_allowed, dtype=bool)
+    true_dim = dim - 1 if force_l1_norm else dim
+    # 保守的初始缩放系数，点数不足时逐步增大
+    n_units = max(int(np.floor((float(grid_size) / 2.0 ** neg_allowed.sum()) ** (1.0 / true_dim) - 1)), 0)
+    while True:
+        points = _integer_grid(dim, n_units, neg_allowed, force_l1_norm)
+        if len(points) >= grid_size:
+            break
+        n_units += 1
+
+    pos_coefs = pd.DataFrame(points[:grid_size]).T * (float(grid_limit) / n_units)
+    neg_coefs = -pos_coefs
+    pos_coefs[pos_coefs < 0] = 0.0
+    neg_coefs[neg_coefs < 0] = 0.0
+    return pos_basis.dot(pos_coefs) + neg_basis.dot(neg_coefs)
+
+
+def mitigation_grid(X_train, y_train, A_train, grid_size=20, grid_limit=2.0):
+    """生成与 GridSearch(DemographicParity()) 内部完全相同的拉格朗日乘子网格，每一列是一个候选点"""
+    from fairlearn.reductions import DemographicParity
+
+    constraints = DemographicParity()
+    constraints.load_data(X_train, y_train, sensitive_features=A_train)
+    return _lambda_grid(grid_size, grid_limit, constraints.pos_basis, constraints.neg_basis,
+                        constraints.neg_basis_present, constraints.default_objective_lambda_vec is not None)
+
+
+def _fit_candidates(estimator, X_train, y_train, A_train, X_test, y_test, A_test, sub_grid):
+    """在一个子网格上运行 GridSearch，并在测试集上评估每个候选模型（在工作进程中执行）"""
+    from fairlearn.reductions import DemographicParity, GridSearch
+
+    # Pipeline（如 标准化 + 逻辑回归）的样本权重要交给最后一步
+    steps = getattr(estimator, 'steps', None)
+    sample_weight_name = f'{steps[-1][0]}__sample_weight' if steps else 'sample_weight'
+    search = GridSearch(estimator, DemographicParity(), grid=sub_grid, sample_weight_name=sample_weight_name)
+    search.fit(X_train, y_train, sensitive_features=A_train)
+    candidates = []
+    for i, predictor in enumerate(search.predictors_):
+        y_pred = predictor.predict(X_test)
+        metrics = compute_group_metrics(y_test, y_pred, A_test)
+        candidates.append(({
+            'grid_point': sub_grid.columns[i],
+            'accuracy': metrics.overall['accuracy'],
+            'demographic_parity_diff': metrics.demographic_parity_difference(),
+            'equalized_odds_diff': metrics.equalized_odds_difference(),
+            # 与 GridSearch 的选择规则相同：目标损失与约束违反量的加权和（基于训练集）
+            'train_loss': (search.objective_weight * search.objectives_[i]
+                           + search.constraint_weight * search.gammas_[sub_grid.columns[i]].max()),
+            'fit_seconds': search.oracle_execution_times_[i],
+        }, np.asarray(y_pred)))
+    return candidates
+
+
+def grid_search_mitigation(estimator, X_train, y_train, A_train, X_test, y_test, A_test, grid_size=20,
+                           n_jobs=None, time_budget=None):
+    """GridSearch + DemographicParity 偏差缓解：网格中的各候选点分发到多个进程并行训练
+
+    estimator 为未训练的单核基础模型（见 parallel.resolve_n_jobs）；
+    time_budget 为计算预算（秒），按轮次分发，预计超出预算时不再开始新的一轮；
+    返回各候选模型在测试集上的准确率与差异指标，以及按 GridSearch 规则选出的最佳候选。
+    """
+    from joblib import Parallel, delayed
+
+    n_jobs = resolve_n_jobs(n_jobs)
+    grid = mitigation_grid(X_train, y_train, A_train, grid_size=grid_size)
+
+    start = time.perf_counter()
+    results = []
+    rounds = 0
+    # 进程池在各轮之间复用；大数组以内存映射方式共享给工作进程
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for offset in range(0, grid.shape[1], n_jobs):
+            elapsed = time.perf_counter() - start
+            if time_budget and rounds and elapsed + elapsed / rounds > time_budget:
+                print(f"⏳ 已达到计算预算 {time_budget}s，跳过剩余 {grid.shape[1] - offset} 个候选点")
+                break
+            columns = grid.columns[offset:offset + n_jobs]
+            batches = parallel(delayed(_fit_candidates)(estimator, X_train, y_train, A_train, X_test, y_test,
+                                                        A_test, grid[[col]])
+                               for col in columns)
+            results.extend(candidate for batch in batches for candidate in batch)
+            rounds += 1
+
+    candidates = pd.DataFrame([record for record, _ in results]).set_index('grid_point')
+    best = int(np.argmin(candidates['train_loss'].to_numpy()))
+    candidates['selected'] = False
+    candidates.iloc[best, candidates.columns.get_loc('selected')] = True
+    return {
+        'candidates': candidates,
+        'lambda_vecs': grid[candidates.index],
+        'best_grid_point': candidates.index[best],
+        'y_pred': results[best][1],
+        'grid_size': grid.shape[1],
+        'evaluated': len(candidates),
+        'elapsed_seconds': time.perf_counter() - start,
+    }
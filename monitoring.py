@@ -0,0 +1,189 @@
+import argparse
+import os
+import pickle
+import tempfile
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from group_metrics import GroupMetrics, outcome_codes
+
+CHECKPOINT_VERSION = 1
+
+
+def to_seconds(timestamps):
+    """时间戳统一为秒（浮点数）：datetime 列按 Unix 时间换算，数值列视为已经是秒"""
+    values = pd.Series(timestamps)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+        return values.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    if values.dtype == object:
+        return to_seconds(pd.to_datetime(values))
+    return values.to_numpy(dtype=float)
+
+
+class FairnessMonitor:
+    """决策流上的增量公平性监控：按时间片累加每组的 TN/FP/FN/TP，维护滚动窗口内的分组指标
+
+    窗口长度 window 秒，每 slide 秒滑动一次（slide 省略或等于 window 时为滚动不重叠的窗口）。
+    每个时间片保存一份 (n_groups, 4) 的计数，窗口合计随时间片的进出增量更新，
+    update 的耗时只与本批行数有关，查询当前差异不需要回看历史数据。
+    """
+
+    def __init__(self, window, slide=None, name=None, max_history=1000):
+        slide = slide or window
+        if window % slide:
+            raise ValueError("window 必须是 slide 的整数倍")
+        self.window = window
+        self.slide = slide
+        self.name = name
+        self.n_slices = int(window // slide)
+        self.index = {}  # 分组标签 -> 行号（按首次出现顺序）
+        self.slices = {}  # 时间片编号 -> 计数
+        self.totals = np.zeros((0, 4), dtype=np.int64)  # 当前窗口内的合计
+        self.latest = None  # 已见到的最大时间片编号
+        self.late_rows = 0
+        # 每次窗口滑过时记录刚结束的窗口的差异
+        self.history = deque(maxlen=max_history)
+
+    def _grow(self):
+        n_groups = len(self.index)
+        if n_groups > len(self.totals):
+            pad = ((0, n_groups - len(self.totals)), (0, 0))
+            self.totals = np.pad(self.totals, pad)
+            for key, counts in self.slices.items():
+                self.slices[key] = np.pad(counts, ((0, n_groups - len(counts)), (0, 0)))
+
+    def _advance(self, latest):
+        """窗口前移到 latest 所在的时间片：每滑过一个时间片记录刚结束的窗口，并移出最早的时间片"""
+        if self.latest is not None:
+            for end in range(self.latest, latest):
+                if not self.slices:
+                    break  # 窗口已空，之后的窗口都没有数据
+                self._record_window(end)
+                counts = self.slices.pop(end - self.n_slices + 1, None)
+                if counts is not None:
+                    self.totals -= counts
+        self.latest = latest
+
+    def _record_window(self, end):
+        if self.totals.sum() == 0:
+            return
+        metrics = self.metrics()
+        self.history.append({
+            'window_start': (end - self.n_slices + 1) * self.slide,
+            'window_end': (end + 1) * self.slide,
+            'count': int(self.totals.sum()),
+            'demographic_parity_diff': metrics.demographic_parity_difference(),
+            'equalized_odds_diff': metrics.equalized_odds_difference(),
+        })
+
+    def update(self, sensitive_features, y_true, y_pred, timestamps, pos_label=1):
+        """累加一批决策；早于当前窗口起点的迟到数据不计入（行数记在 late_rows）"""
+        seconds = to_seconds(timestamps)
+        if len(seconds) == 0:
+            return self
+        codes, labels = pd.factorize(pd.Series(np.asarray(sensitive_features)))
+        if (codes < 0).any():
+            raise ValueError("敏感特征列中存在缺失值，请先进行预处理")
+        lookup = np.array([self.index.setdefault(label, len(self.index)) for label in labels], dtype=np.int64)
+        self._grow()
+        n_groups = len(self.index)
+
+        # 一次 bincount 按 (时间片, 分组, 结果) 计数，只涉及本批出现过的时间片
+        slice_keys, slice_codes = np.unique(np.floor_divide(seconds, self.slide).astype(np.int64),
+                                            return_inverse=True)
+        flat = (slice_codes * n_groups + lookup[codes]) * 4 + outcome_codes(y_true, y_pred, pos_label)
+        counts = np.bincount(flat, minlength=len(slice_keys) * n_groups * 4).reshape(len(slice_keys), n_groups, 4)
+
+        # 按时间顺序并入各时间片，批内跨越多个时间片时，中间结束的窗口也能完整记录
+        for key, slice_counts in zip(slice_keys.tolist(), counts):
+            if self.latest is None or key > self.latest:
+                self._advance(key)
+            if key <= self.latest - self.n_slices:
+                self.late_rows += int(slice_counts.sum())
+                continue
+            if key in self.slices:
+                self.slices[key] += slice_counts
+            else:
+                self.slices[key] = slice_counts.copy()
+            self.totals += slice_counts
+        return self
+
+    def metrics(self):
+        """当前窗口内的分组指标（GroupMetrics），没有出现过数据的分组不参与比较"""
+        present = self.totals.sum(axis=1) > 0
+        labels = pd.Index(list(self.index), name=self.name)
+        return GroupMetrics(self.totals[present], labels[present], name=self.name)
+
+    def current(self):
+        """当前窗口的 DP / EO 差异与各组比率"""
+        metrics = self.metrics()
+        return {
+            'window_start': (self.latest - self.n_slices + 1) * self.slide if self.latest is not None else None,
+            'window_end': (self.latest + 1) * self.slide if self.latest is not None else None,
+            'count': int(self.totals.sum()),
+            'demographic_parity_diff': metrics.demographic_parity_difference(),
+            'equalized_odds_diff': metrics.equalized_odds_difference(),
+            'by_group': metrics.by_group,
+        }
+
+    def checkpoint(self, path):
+        """把状态写入磁盘（先写临时文件再原子替换），重启后用 FairnessMonitor.restore 继续"""
+        state = dict(self.__dict__, version=CHECKPOINT_VERSION)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def restore(cls, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.pop('version', None) != CHECKPOINT_VERSION:
+            raise ValueError(f"不兼容的检查点版本: {path}")
+        monitor = cls.__new__(cls)
+        monitor.__dict__.update(state)
+        return monitor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按时间顺序分块回放决策文件，输出滚动窗口内的公平性差异")
+    parser.add_argument('file', help="CSV 文件，包含敏感特征、真实值、预测值与时间戳列")
+    parser.add_argument('--sensitive', required=True)
+    parser.add_argument('--target', required=True)
+    parser.add_argument('--prediction', required=True)
+    parser.add_argument('--timestamp', required=True)
+    parser.add_argument('--window', type=float, default=3600, help="窗口长度（秒）")
+    parser.add_argument('--slide', type=float, default=None, help="滑动步长（秒，默认等于窗口长度）")
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--checkpoint', default=None, help="检查点文件：存在时从中恢复，每块处理完后更新")
+    args = parser.parse_args()
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        monitor = FairnessMonitor.restore(args.checkpoint)
+        print(f"♻️ 已从检查点恢复: {args.checkpoint}")
+    else:
+        monitor = FairnessMonitor(args.window, args.slide, name=args.sensitive)
+
+    columns = [args.sensitive, args.target, args.prediction, args.timestamp]
+    for chunk in pd.read_csv(args.file, usecols=columns, chunksize=args.chunksize):
+        chunk = chunk.dropna()
+        monitor.update(chunk[args.sensitive], chunk[args.target], chunk[args.prediction], chunk[args.timestamp])
+        if args.checkpoint:
+            monitor.checkpoint(args.checkpoint)
+        current = monitor.current()
+        print(f"[{current['window_start']:.0f}, {current['window_end']:.0f}) 样本 {current['count']}: "
+              f"统计均等差异 {current['demographic_parity_diff']:.3f}，"
+              f"均等几率差异 {current['equalized_odds_diff']:.3f}")
+
+    print("\n📋 当前窗口的分组指标:")
+    print(monitor.current()['by_group'].round(3))
+    if monitor.late_rows:
+        print(f"⚠️ 迟到数据 {monitor.late_rows} 行未计入")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+import os
+
+
+def resolve_n_jobs(n_jobs, default=1):
+    """把 n_jobs 换算为实际的进程/线程数：None 取 default，负数表示使用全部 CPU 核心
+
+    交叉验证的各折、偏差缓解的网格候选点与 bootstrap 的各块都按 n_jobs 分发到多个进程；
+    并行发生在这些任务之间，单个模型只用一个核心，避免进程数 × 线程数超额占用 CPU。
+    """
+    if n_jobs is None:
+        return default
+    return os.cpu_count() if n_jobs < 0 else n_jobs
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from storage import default_dir, evict_lru, private_dir, remove_file
+
+DEFAULT_MAX_BYTES = int(os.environ.get('FAIRNESS_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+logger = logging.getLogger(__name__)
+
+
+def hash_stream(stream, block_size=1024 * 1024):
+    """分块计算上传内容的 sha256，读完后把文件指针移回开头"""
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(block_size), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def make_key(content_hash, params):
+    """缓存键 = 数据内容哈希 + 分析参数"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{content_hash}:{payload}".encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """磁盘上的 LRU 结果缓存：按访问时间淘汰，总大小不超过 max_bytes，同一用户的多个进程共享
+
+    目录默认为 FAIRNESS_CACHE_DIR 或临时目录下按用户区分的子目录，权限为 0700。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = private_dir(cache_dir or default_dir('FAIRNESS_CACHE_DIR', 'ai-fairness-cache'))
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 写坏的文件或类已改名的旧条目（AttributeError / ModuleNotFoundError 等）都按未命中处理并删除
+            logger.warning("结果缓存条目无法读取，已删除: %s", path, exc_info=True)
+            remove_file(path)
+            return None
+        # 以修改时间记录最近访问，供 LRU 淘汰使用
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # 刚被其他 worker 淘汰
+        return value
+
+    def put(self, key, value):
+        # 先写临时文件再原子替换，其他进程不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """删除最久未访问的条目，直到总大小回到上限以内"""
+        evict_lru(self.cache_dir, self.max_bytes, lambda entry: entry.name.endswith('.pkl'))
+
+    def clear(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                os.remove(entry.path)
+
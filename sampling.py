@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from group_metrics import TN, FP, FN, TP, rates_from_counts
+
+# 95% 置信水平对应的正态分位数
+Z_95 = 1.959964
+
+
+class StratifiedReservoir:
+    """单次流式遍历的分层蓄水池抽样：每个分层（如 敏感特征 × 目标值）各保留至多 per_stratum 行
+
+    每行分配一个均匀随机优先级，每层保留优先级最小的 per_stratum 行，等价于层内无放回的简单随机抽样；
+    小分层不会被大分层挤掉。同时精确统计每层的总行数，用于加权估计。
+    """
+
+    def __init__(self, per_stratum, random_state=42):
+        self.per_stratum = per_stratum
+        self.rng = np.random.default_rng(random_state)
+        self.index = {}  # 分层键 -> 编号（按首次出现顺序）
+        self.population = np.zeros(0, dtype=np.int64)
+        # 每层当前入选门槛：层未满时为 1（任何行都能进入），满了之后为已保留行中的最大优先级
+        self.thresholds = np.zeros(0)
+        self.sample = None
+
+    def update(self, frame, strata_columns):
+        if len(frame) == 0:
+            return self
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(frame[strata_columns]))
+        lookup = np.array([self.index.setdefault(key, len(self.index)) for key in uniques], dtype=np.int64)
+        stratum = lookup[codes]
+        n_strata = len(self.index)
+        self.population = np.pad(self.population, (0, n_strata - len(self.population)))
+        self.thresholds = np.pad(self.thresholds, (0, n_strata - len(self.thresholds)), constant_values=1.0)
+        self.population += np.bincount(stratum, minlength=n_strata)
+
+        # 先按门槛过滤，已满的分层只有优先级更小的行才可能入选，每块的主要开销与块大小成正比
+        priority = self.rng.random(len(frame))
+        candidates = priority < self.thresholds[stratum]
+        chunk = frame[candidates].assign(_stratum=stratum[candidates], _priority=priority[candidates])
+        combined = chunk if self.sample is None else pd.concat([self.sample, chunk], ignore_index=True)
+
+        # 按 (分层, 优先级) 排序后每层取前 per_stratum 行
+        strata = combined['_stratum'].to_numpy()
+        order = np.lexsort((combined['_priority'].to_numpy(), strata))
+        sorted_strata = strata[order]
+        positions = np.arange(len(order))
+        run_start = np.maximum.accumulate(np.where(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]],
+                                                   positions, 0))
+        keep = order[positions - run_start < self.per_stratum]
+        self.sample = combined.take(np.sort(keep)).reset_index(drop=True)
+
+        full = np.bincount(self.sample['_stratum'], minlength=n_strata) >= self.per_stratum
+        max_priority = self.sample.groupby('_stratum')['_priority'].max().reindex(range(n_strata)).to_numpy()
+        self.thresholds = np.where(full, max_priority, 1.0)
+        return self
+
+    def strata(self):
+        """各分层的键、总行数与抽样行数"""
+        keys = list(self.index)
+        sampled = np.bincount(self.sample['_stratum'], minlength=len(keys)) if self.sample is not None else 0
+        return keys, self.population, sampled
+
+
+def _proportion_se(p, n, N):
+    """层内简单随机抽样的比例标准误（含有限总体校正，全量抽取时为 0）"""
+    n = np.asarray(n, dtype=float)
+    N = np.asarray(N, dtype=float)
+    fpc = np.zeros_like(N)
+    np.divide(N - n, N - 1, out=fpc, where=N > 1)
+    variance = np.zeros_like(n)
+    np.divide(p * (1 - p), n, out=variance, where=n > 0)
+    return np.sqrt(variance * np.clip(fpc, 0, 1))
+
+
+def stratified_estimates(group_codes, y_true, y_pred, n_groups, population, pos_label=1):
+    """由按 分组 × 目标值 分层的样本估计分组指标与标准误
+
+    group_codes / y_true / y_pred 为样本行；population 为形状 (n_groups, 2) 的各层总行数（列 0 为负类）。
+    TPR 只由正类层估计，FPR 只由负类层估计，其余比率按层的总行数加权组合。
+    返回 (按总体加权的 (n_groups, 4) 计数估计, 各组比率标准误 DataFrame)。
+    """
+    positive = np.asarray(y_true) == pos_label
+    predicted = np.asarray(y_pred) == pos_label
+    keys = np.asarray(group_codes, dtype=np.int64) * 2 + positive
+    n = np.bincount(keys, minlength=n_groups * 2).reshape(n_groups, 2)
+    hits = np.bincount(keys, weights=predicted, minlength=n_groups * 2).reshape(n_groups, 2)
+    rate = np.zeros(hits.shape)
+    np.divide(hits, n, out=rate, where=n > 0)
+    fpr, tpr = rate[:, 0], rate[:, 1]
+    n_neg, n_pos = population[:, 0].astype(float), population[:, 1].astype(float)
+
+    counts = np.empty((n_groups, 4))
+    counts[:, FP] = n_neg * fpr
+    counts[:, TN] = n_neg - counts[:, FP]
+    counts[:, TP] = n_pos * tpr
+    counts[:, FN] = n_pos - counts[:, TP]
+
+    fpr_se = _proportion_se(fpr, n[:, 0], population[:, 0])
+    tpr_se = _proportion_se(tpr, n[:, 1], population[:, 1])
+    total = n_neg + n_pos
+    share_neg = np.divide(n_neg, total, out=np.zeros_like(total), where=total > 0)
+    share_pos = 1 - share_neg
+    # 选择率与准确率都是两层比率的加权和，方差按权重平方相加
+    combined_se = np.sqrt((share_pos * tpr_se) ** 2 + (share_neg * fpr_se) ** 2)
+    errors = pd.DataFrame({
+        'accuracy': combined_se,
+        'selection_rate': combined_se,
+        'recall': tpr_se,
+        'false_positive_rate': fpr_se,
+        'sampled': n.sum(axis=1),
+    })
+    return counts, errors
+
+
+def disparity_bounds(counts, errors, z=Z_95):
+    """DP / EO 差异的近似误差界：取差值最大的两组，两组标准误平方和开方后乘以 z"""
+    def spread(values, se):
+        hi, lo = int(np.argmax(values)), int(np.argmin(values))
+        return values[hi] - values[lo], z * np.sqrt(se[hi] ** 2 + se[lo] ** 2)
+
+    if len(counts) == 0:
+        return {'demographic_parity_diff': float('nan'), 'equalized_odds_diff': float('nan')}
+    rates = rates_from_counts(counts)
+    _, dp_bound = spread(rates['selection_rate'], errors['selection_rate'].to_numpy())
+    tpr_diff, tpr_bound = spread(rates['recall'], errors['recall'].to_numpy())
+    fpr_diff, fpr_bound = spread(rates['false_positive_rate'], errors['false_positive_rate'].to_numpy())
+    return {
+        'demographic_parity_diff': float(dp_bound),
+        # 与 equalized_odds_difference 一致，取 TPR / FPR 中差值较大的一项
+        'equalized_odds_diff': float(tpr_bound if tpr_diff >= fpr_diff else fpr_bound),
+    }
@@ -0,0 +1,45 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# 各入口的冷启动导入；在新的解释器进程里测量，避免模块缓存影响结果
+ENTRY_POINTS = {
+    'interactive2': 'import interactive2',
+    'app1.1': 'import wsgi',
+    'app1.1 (不预热)': 'import os; os.environ["FAIRNESS_WARM_IMPORTS"] = "0"; import wsgi',
+}
+
+
+def measure(statement, repeat=5):
+    """在独立进程中执行导入语句 repeat 次，返回每次的耗时（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量 CLI 与 Web 应用的冷启动时间")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=None, help="任一入口的中位数超过该值时以非零状态退出")
+    args = parser.parse_args()
+
+    slow = []
+    for name, statement in ENTRY_POINTS.items():
+        timings = measure(statement, args.repeat)
+        median = statistics.median(timings)
+        print(f"⏱️ {name}: 中位数 {median:.0f} ms（最小 {min(timings):.0f} ms，最大 {max(timings):.0f} ms）")
+        if args.max_ms is not None and median > args.max_ms:
+            slow.append(name)
+
+    if slow:
+        print(f"❌ 启动时间超过 {args.max_ms:.0f} ms: {slow}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
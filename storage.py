@@ -0,0 +1,61 @@
+import os
+import stat
+import tempfile
+
+
+def default_dir(env_var, name):
+    """缓存目录：环境变量指定时使用该路径，否则为临时目录下按用户区分的子目录（调用时解析，不在导入时固定）"""
+    path = os.environ.get(env_var)
+    if path:
+        return path
+    owner = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(tempfile.gettempdir(), f"{name}-{owner}")
+
+
+def private_dir(path):
+    """创建只有当前用户可访问（0700）的目录并返回路径
+
+    目录中的文件会被反序列化（pickle / joblib），其他用户能写入就能让服务执行任意代码，
+    因此已存在的目录是符号链接或属于其他用户时拒绝使用，属于当前用户但权限过宽时收紧为 0700。
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) or not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"缓存路径不是普通目录: {path}")
+    if hasattr(os, 'getuid'):
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"缓存目录属于其他用户，拒绝使用: {path}")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # 已被其他 worker 删除
+
+
+def evict_lru(directory, max_bytes, match, size=None, remove=remove_file):
+    """按最近访问时间（修改时间）淘汰 directory 中满足 match(entry) 的条目，直到总大小不超过 max_bytes
+
+    size(path) 用于计算目录类条目的大小，默认取文件大小；remove(path) 删除一个条目。
+    读取条目时用 os.utime 更新修改时间即可记录访问。
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if not match(entry):
+            continue
+        try:
+            info = entry.stat()
+            entries.append((info.st_mtime, size(entry.path) if size else info.st_size, entry.path))
+        except FileNotFoundError:
+            continue  # 已被其他进程删除
+
+    total = sum(entry_size for _, entry_size, _ in entries)
+    for _, entry_size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        remove(path)
+        total -= entry_size
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# 前几个特征沿用示例贷款数据的列名，更多特征依次命名为 feature_6、feature_7 ...
+FEATURE_NAMES = ['age', 'income', 'credit_score', 'employment_years', 'debt_to_income']
+GROUP_NAMES = ['Male', 'Female', 'Other']
+
+
+def feature_names(n_features):
+    return [FEATURE_NAMES[i] if i < len(FEATURE_NAMES) else f"feature_{i + 1}" for i in range(n_features)]
+
+
+def group_names(n_groups):
+    return [GROUP_NAMES[i] if i < len(GROUP_NAMES) else f"group_{i + 1}" for i in range(n_groups)]
+
+
+def group_probabilities(n_groups, imbalance=1.0):
+    """各分组的占比：最大组与最小组的样本数之比为 imbalance，中间按几何级数递减"""
+    if n_groups == 1:
+        return np.ones(1)
+    weights = float(imbalance) ** (-np.arange(n_groups) / (n_groups - 1))
+    return weights / weights.sum()
+
+
+def _feature_column(name, rng, n_rows):
+    # 示例列保持原有的取值范围，其余特征为标准正态
+    if name == 'age':
+        return rng.integers(18, 70, n_rows)
+    if name == 'income':
+        return rng.normal(50000, 20000, n_rows)
+    if name == 'credit_score':
+        return rng.normal(650, 100, n_rows)
+    if name == 'employment_years':
+        return rng.integers(0, 40, n_rows)
+    if name == 'debt_to_income':
+        return rng.beta(2, 5, n_rows)
+    return rng.normal(0, 1, n_rows)
+
+
+def generate_loan_data(n_rows=1000, n_features=3, n_groups=3, imbalance=1.0, missing_rate=0.0,
+                       group_effect=0.5, with_predictions=False, random_state=42, group_weights=None):
+    """生成合成贷款数据
+
+    n_features: 特征列数；n_groups: 敏感特征 gender 的分组数；
+    imbalance: 最大组与最小组的样本数之比；group_weights: 直接指定各组占比（如 [0.5, 0.45, 0.05]），优先于 imbalance；
+    missing_rate: 特征列中缺失值的比例；
+    group_effect: 分组对批准概率的影响（0 表示各组无差异）；
+    with_predictions: 额外生成一个准确率约 85% 的预测列 y_pred，用于模型评估模式
+    """
+    rng = np.random.default_rng(random_state)
+    names = feature_names(n_features)
+    data = {name: _feature_column(name, rng, n_rows) for name in names}
+
+    if group_weights is not None:
+        probabilities = np.asarray(group_weights, dtype=float)
+        n_groups = len(probabilities)
+        probabilities = probabilities / probabilities.sum()
+    else:
+        probabilities = group_probabilities(n_groups, imbalance)
+    groups = rng.choice(n_groups, n_rows, p=probabilities)
+    data['gender'] = pd.Categorical.from_codes(groups, categories=group_names(n_groups))
+
+    # 批准概率由标准化后的特征和分组偏移共同决定，使公平性指标不为 0
+    logit = np.zeros(n_rows)
+    for name in names:
+        values = np.asarray(data[name], dtype=float)
+        logit += (values - values.mean()) / (values.std() or 1.0) / n_features
+    logit += 0.85 - group_effect * groups / max(n_groups - 1, 1)
+    approved = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(np.int64)
+    data['loan_approved'] = approved
+
+    if with_predictions:
+        flip = rng.random(n_rows) < 0.15
+        data['y_pred'] = np.where(flip, 1 - approved, approved)
+
+    df = pd.DataFrame(data)
+    if missing_rate > 0:
+        for name in names:
+            mask = rng.random(n_rows) < missing_rate
+            df[name] = df[name].astype(float).mask(mask)
+    return df
+
+
+def write_synthetic_csv(file_path, n_rows, chunk_rows=1_000_000, random_state=42, **params):
+    """分块生成并写入 CSV，内存占用只与 chunk_rows 有关，可生成上千万行的数据"""
+    seeds = np.random.SeedSequence(random_state).spawn(-(-n_rows // chunk_rows))
+    for i, seed in enumerate(seeds):
+        rows = min(chunk_rows, n_rows - i * chunk_rows)
+        chunk = generate_loan_data(rows, random_state=seed, **params)
+        chunk.to_csv(file_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return file_path
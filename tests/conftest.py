@@ -0,0 +1,22 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 项目模块位于仓库根目录（没有打包），测试时从根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def decisions():
+    """随机的 敏感特征 g / 真实值 t / 预测值 p 三列数据：decisions(n, groups, seed=0)"""
+    def make(n, groups, seed=0):
+        rng = np.random.default_rng(seed)
+        return pd.DataFrame({
+            'g': rng.choice(groups, size=n),
+            't': rng.integers(0, 2, size=n),
+            'p': rng.integers(0, 2, size=n),
+        })
+    return make
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import bootstrap_ci
+from bootstrap_ci import bootstrap_fairness_ci, resamples_per_chunk
+from group_metrics import compute_group_metrics
+from interactive2 import multi_attribute_report
+
+
+def test_chunk_size_follows_memory_budget():
+    # 每块计数数组 (块大小, 分组数, 4) 不超过预算，分组越多块越小
+    budget = 1024 * 1024
+    for n_groups in (1, 3, 100, 5000):
+        size = resamples_per_chunk(n_groups, budget)
+        assert size * n_groups * 4 * 8 <= budget
+        assert (size + 1) * n_groups * 4 * 8 > budget
+    assert resamples_per_chunk(10 ** 9, budget) == 1
+
+
+def test_interval_does_not_depend_on_process_count(monkeypatch, decisions):
+    df = decisions(2000, ['a', 'b', 'c'])
+    counts = compute_group_metrics(df['t'], df['p'], df['g']).counts
+    # 预算很小时拆成多块，单进程与多进程的结果必须一致
+    monkeypatch.setattr(bootstrap_ci, 'CHUNK_BYTES', 3 * 4 * 8 * 150)
+
+    single = bootstrap_fairness_ci(counts, n_resamples=1000, n_jobs=1)
+    parallel = bootstrap_fairness_ci(counts, n_resamples=1000, n_jobs=2)
+
+    assert single == parallel
+    low, high = single['demographic_parity_diff']
+    assert low <= compute_group_metrics(df['t'], df['p'], df['g']).demographic_parity_difference() <= high
+
+
+def test_multi_attribute_report_gives_interval_per_attribute(decisions):
+    df = decisions(3000, ['a', 'b'], seed=4)
+    df['r'] = np.random.default_rng(5).choice(['n', 's', 'w'], size=len(df))
+
+    results = multi_attribute_report(df['t'], df['p'], df[['g', 'r']], bootstrap=500)
+
+    fairness_ci = results['fairness_ci']
+    assert fairness_ci['n_resamples'] == 500
+    assert list(fairness_ci['by_attribute']) == ['g', 'r']
+    for name in ('g', 'r'):
+        expected = bootstrap_fairness_ci(compute_group_metrics(df['t'], df['p'], df[name]).counts, n_resamples=500)
+        for key in ('demographic_parity_diff', 'equalized_odds_diff'):
+            assert fairness_ci['by_attribute'][name][key] == pytest.approx(expected[key])
+
+
+def test_multi_attribute_report_skips_interval_by_default(decisions):
+    df = decisions(200, ['a', 'b'])
+    assert multi_attribute_report(df['t'], df['p'], df[['g']])['fairness_ci'] is None
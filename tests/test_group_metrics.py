@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fairlearn.metrics import (MetricFrame, count, demographic_parity_difference, equalized_odds_difference,
+                               selection_rate)
+from sklearn.metrics import accuracy_score, precision_score, recall_score
+
+from group_metrics import GroupCounter, compute_group_metrics, factorize_intersections
+
+GROUPS = {'numeric': [3, 0, 7], 'string': ['b', 'a', 'c']}
+
+
+def _columns(df):
+    return df['t'], df['p'], df['g']
+
+
+def _metric_frame(y_true, y_pred, sensitive_features):
+    return MetricFrame(
+        metrics={
+            'accuracy': accuracy_score,
+            'precision': lambda t, p: precision_score(t, p, zero_division=0),
+            'recall': lambda t, p: recall_score(t, p, zero_division=0),
+            'selection_rate': selection_rate,
+            'count': count,
+        },
+        y_true=y_true, y_pred=y_pred, sensitive_features=sensitive_features)
+
+
+@pytest.mark.parametrize('kind', list(GROUPS))
+def test_compute_group_metrics_matches_metric_frame(kind, decisions):
+    y_true, y_pred, groups = _columns(decisions(2000, GROUPS[kind]))
+
+    metrics = compute_group_metrics(y_true, y_pred, groups)
+
+    expected = _metric_frame(y_true, y_pred, groups)
+    pd.testing.assert_frame_equal(metrics.by_group, expected.by_group, check_dtype=False, check_names=False)
+    pd.testing.assert_series_equal(metrics.overall, expected.overall, check_dtype=False, check_names=False)
+    assert metrics.demographic_parity_difference() == pytest.approx(
+        demographic_parity_difference(y_true, y_pred, sensitive_features=groups))
+    assert metrics.equalized_odds_difference() == pytest.approx(
+        equalized_odds_difference(y_true, y_pred, sensitive_features=groups))
+    assert metrics.weighted_precision_recall() == pytest.approx(
+        (precision_score(y_true, y_pred, average='weighted'), recall_score(y_true, y_pred, average='weighted')))
+
+
+@pytest.mark.parametrize('kind', list(GROUPS))
+@pytest.mark.parametrize('chunk_size', [1, 7, 333, 5000])
+def test_group_counter_merges_chunks(kind, chunk_size, decisions):
+    y_true, y_pred, groups = _columns(decisions(1000, GROUPS[kind], seed=1))
+
+    # 前一半逐块累加，后一半用另一个计数器统计后合并
+    first, second = GroupCounter(name='g'), GroupCounter(name='g')
+    for start in range(0, 1000, chunk_size):
+        counter = first if start < 500 else second
+        rows = slice(start, start + chunk_size)
+        counter.update(y_true[rows], y_pred[rows], groups[rows])
+    result = first.merge(second).result()
+
+    expected = compute_group_metrics(y_true, y_pred, groups)
+    assert list(result.labels) == list(expected.labels)
+    np.testing.assert_array_equal(result.counts, expected.counts)
+    pd.testing.assert_frame_equal(result.by_group, _metric_frame(y_true, y_pred, groups).by_group,
+                                  check_dtype=False, check_names=False)
+
+
+def test_factorize_intersections_matches_metric_frame(decisions):
+    y_true, y_pred, numeric = _columns(decisions(3000, GROUPS['numeric'], seed=2))
+    rng = np.random.default_rng(3)
+    sensitive = pd.DataFrame({'n': numeric, 's': rng.choice(GROUPS['string'], size=len(numeric))})
+
+    codes, labels = factorize_intersections(sensitive)
+
+    # 每一行的编号都指回它自己的 (n, s) 组合，且标签按各列排序
+    assert list(labels[codes]) == list(sensitive.itertuples(index=False, name=None))
+    assert list(labels) == sorted(set(labels))
+    assert list(labels.names) == ['n', 's']
+
+    metrics = compute_group_metrics(y_true, y_pred, sensitive)
+    pd.testing.assert_frame_equal(metrics.by_group, _metric_frame(y_true, y_pred, sensitive).by_group,
+                                  check_dtype=False)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from group_metrics import compute_group_metrics
+from monitoring import FairnessMonitor
+
+
+@pytest.fixture
+def stream(decisions):
+    """按时间排序的决策流，时间戳 ts 为 [0, 100) 秒内的随机时刻"""
+    df = decisions(3000, ['a', 'b', 'c'], seed=7)
+    df['ts'] = np.sort(np.random.default_rng(8).uniform(0, 100, size=len(df)))
+    return df
+
+
+def _feed(monitor, df, sizes=(1, 17, 250, 40)):
+    # 批大小不一，批边界与时间片边界错开
+    start, i = 0, 0
+    while start < len(df):
+        batch = df.iloc[start:start + sizes[i % len(sizes)]]
+        monitor.update(batch['g'], batch['t'], batch['p'], batch['ts'])
+        start += len(batch)
+        i += 1
+    return monitor
+
+
+def _expected(df, start, end):
+    rows = df[(df['ts'] >= start) & (df['ts'] < end)]
+    return compute_group_metrics(rows['t'], rows['p'], rows['g'])
+
+
+@pytest.mark.parametrize('window, slide', [(10, None), (10, 2.5)])
+def test_windows_roll_over(stream, window, slide):
+    monitor = _feed(FairnessMonitor(window, slide, name='g'), stream)
+
+    # 每滑过一步记录一个窗口（开头的窗口不满），且与直接按时间筛选后计算的结果一致
+    step = slide or window
+    assert [record['window_end'] for record in monitor.history] == pytest.approx(np.arange(step, 100, step).tolist())
+    for record in monitor.history:
+        expected = _expected(stream, record['window_start'], record['window_end'])
+        assert record['count'] == expected.counts.sum()
+        assert record['demographic_parity_diff'] == pytest.approx(expected.demographic_parity_difference())
+        assert record['equalized_odds_diff'] == pytest.approx(expected.equalized_odds_difference())
+
+    current = monitor.current()
+    expected = _expected(stream, current['window_start'], current['window_end'])
+    pd.testing.assert_frame_equal(current['by_group'].sort_index(), expected.by_group, check_names=False)
+    assert monitor.late_rows == 0
+
+
+def test_late_rows_are_counted_not_merged(stream):
+    monitor = _feed(FairnessMonitor(10, 5, name='g'), stream)
+    before = monitor.totals.copy()
+    late = stream[stream['ts'] < 80].iloc[:123]
+    in_window = stream[stream['ts'] >= 92].iloc[:45]
+
+    monitor.update(late['g'], late['t'], late['p'], late['ts'])
+    assert monitor.late_rows == 123
+    np.testing.assert_array_equal(monitor.totals, before)
+
+    # 仍在当前窗口内的较早时间片照常计入
+    monitor.update(in_window['g'], in_window['t'], in_window['p'], in_window['ts'])
+    assert monitor.late_rows == 123
+    assert monitor.totals.sum() == before.sum() + 45
+
+
+def test_checkpoint_restore_continues_counts(stream, tmp_path):
+    full = _feed(FairnessMonitor(10, 5, name='g'), stream)
+
+    half = len(stream) // 2
+    first = _feed(FairnessMonitor(10, 5, name='g'), stream.iloc[:half])
+    path = tmp_path / 'monitor.pkl'
+    first.checkpoint(path)
+    resumed = _feed(FairnessMonitor.restore(path), stream.iloc[half:])
+
+    assert list(resumed.history) == list(full.history)
+    np.testing.assert_array_equal(resumed.totals, full.totals)
+    assert resumed.index == full.index
+    assert resumed.late_rows == full.late_rows == 0
+    pd.testing.assert_frame_equal(resumed.current()['by_group'], full.current()['by_group'])
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sampling import StratifiedReservoir
+
+
+@pytest.fixture
+def skewed(decisions):
+    """分组大小悬殊的数据：小分组 'c' 的行数少于每层保留数"""
+    df = pd.concat([decisions(5000, ['a', 'b'], seed=9), decisions(30, ['c'], seed=10)], ignore_index=True)
+    df = df.sample(frac=1, random_state=11).reset_index(drop=True)
+    df['row'] = np.arange(len(df))
+    return df
+
+
+def _reservoir(df, chunk_size, per_stratum=100):
+    reservoir = StratifiedReservoir(per_stratum, random_state=3)
+    for start in range(0, len(df), chunk_size):
+        reservoir.update(df.iloc[start:start + chunk_size], ['g', 't'])
+    return reservoir
+
+
+@pytest.mark.parametrize('chunk_size', [7, 97, 1000, 10000])
+def test_each_stratum_keeps_at_most_per_stratum_rows(skewed, chunk_size):
+    reservoir = _reservoir(skewed, chunk_size)
+
+    keys, population, sampled = reservoir.strata()
+    expected = skewed.groupby(['g', 't']).size()
+    # 总行数精确，每层保留 min(per_stratum, 总行数) 行
+    assert dict(zip(keys, population)) == expected.to_dict()
+    np.testing.assert_array_equal(sampled, np.minimum(population, 100))
+
+    # 样本是原数据中不重复的行，且都属于记录的分层
+    sample = reservoir.sample
+    assert sample['row'].is_unique
+    original = skewed.set_index('row').loc[sample['row'], ['g', 't', 'p']].reset_index(drop=True)
+    pd.testing.assert_frame_equal(sample[['g', 't', 'p']], original)
+    assert [keys[code] for code in sample['_stratum']] == list(zip(sample['g'], sample['t']))
+
+
+def test_sample_does_not_depend_on_chunk_size(skewed):
+    # 优先级按行依次抽取，分块方式不同时保留的行相同
+    rows = [set(_reservoir(skewed, chunk_size).sample['row']) for chunk_size in (7, 97, 10000)]
+    assert rows[0] == rows[1] == rows[2]
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from group_metrics import compute_group_metrics
+from interactive2 import data_preprocessing, fairlearn_analysis, load_data
+
+
+def test_chunked_evaluation_with_numeric_sensitive_column(tmp_path, decisions):
+    df = decisions(1000, [0, 1, 2])
+    path = tmp_path / 'num.csv'
+    df.to_csv(path, index=False)
+
+    results = fairlearn_analysis(load_data(str(path), chunksize=100), 'g', 't', [], prediction_column='p')
+
+    expected = compute_group_metrics(df['t'], df['p'], df['g'])
+    assert list(results['metrics'].labels) == [0, 1, 2]
+    np.testing.assert_array_equal(results['metrics'].counts, expected.counts)
+
+
+def test_chunked_evaluation_restores_string_labels(tmp_path, decisions):
+    df = decisions(1000, ['b', 'a', 'c'], seed=1)
+    path = tmp_path / 'str.csv'
+    df.to_csv(path, index=False)
+
+    results = fairlearn_analysis(load_data(str(path), chunksize=100), 'g', 't', [], prediction_column='p')
+
+    expected = compute_group_metrics(df['t'], df['p'], df['g'])
+    by_group = results['metrics'].by_group.sort_index()
+    pd.testing.assert_frame_equal(by_group, expected.by_group.sort_index(), check_names=False)
+
+
+def _in_memory(path, file_type):
+    df, _ = data_preprocessing(load_data(str(path), file_type), [], 'g', 't', prediction_column='p')
+    return fairlearn_analysis(df, 'g', 't', [], prediction_column='p')['metrics']
+
+
+def test_chunked_evaluation_encodes_categorical_labels(tmp_path, decisions):
+    df = decisions(1000, ['x', 'y'], seed=2)
+    for col in ('t', 'p'):
+        df[col] = df[col].map({0: 'no', 1: 'yes'}).astype('category')
+    path = tmp_path / 'cat.parquet'
+    df.to_parquet(path, row_group_size=100)
+
+    streamed = fairlearn_analysis(load_data(str(path), 'parquet', chunksize=100), 'g', 't', [],
+                                  prediction_column='p')['metrics']
+
+    expected = _in_memory(path, 'parquet')
+    pd.testing.assert_frame_equal(streamed.by_group, expected.by_group, check_names=False)
+
+
+def test_chunked_evaluation_with_mixed_chunk_types(tmp_path, decisions):
+    # 前 9 块的敏感特征只有数字，最后一块才出现字符串：整表读取时整列都是字符串
+    df = decisions(1000, [3, 2, 1]).astype({'g': object})
+    df.loc[900:, 'g'] = np.random.default_rng(3).choice(['1', 'X'], size=100)
+    path = tmp_path / 'mixed.csv'
+    df.to_csv(path, index=False)
+
+    streamed = fairlearn_analysis(load_data(str(path), chunksize=100), 'g', 't', [], prediction_column='p')['metrics']
+
+    expected = _in_memory(path, 'csv')
+    assert set(expected.labels) == {'1', '2', '3', 'X'}
+    pd.testing.assert_frame_equal(streamed.by_group, expected.by_group, check_names=False)
+
+
+def test_chunked_evaluation_applies_min_group_size(tmp_path, decisions):
+    df = decisions(1000, ['a', 'b'], seed=4)
+    df.loc[::100, 'g'] = 'rare'
+    path = tmp_path / 'rare.csv'
+    df.to_csv(path, index=False)
+
+    streamed = fairlearn_analysis(load_data(str(path), chunksize=100), 'g', 't', [], prediction_column='p',
+                                  min_group_size=50)
+
+    prepared, _ = data_preprocessing(load_data(str(path)), [], 'g', 't', prediction_column='p')
+    expected = fairlearn_analysis(prepared, 'g', 't', [], prediction_column='p', min_group_size=50)
+    assert 'rare' not in streamed['metrics'].labels
+    pd.testing.assert_frame_equal(streamed['metrics'].by_group, expected['metrics'].by_group, check_names=False)
+    assert streamed['fairness_metrics'] == expected['fairness_metrics']
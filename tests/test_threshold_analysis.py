@@ -0,0 +1,69 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from bootstrap_ci import disparity_arrays
+from group_metrics import TN, TP, compute_group_metrics
+from threshold_analysis import compute_threshold_curves
+
+
+def _scored(seed, n=600):
+    # 得分只保留一位小数，每组约十个阈值，便于穷举所有阈值组合
+    rng = np.random.default_rng(seed)
+    groups = rng.choice(['a', 'b', 'c'], size=n)
+    y_true = rng.integers(0, 2, size=n)
+    scores = np.round(np.clip(rng.normal(0.4 + 0.2 * y_true + 0.1 * (groups == 'a'), 0.2), 0, 1), 1)
+    return y_true, scores, groups
+
+
+def _brute_force(curves, constraint, bound):
+    """穷举每组的每个阈值，返回满足约束的最高整体准确率（没有可行组合时为 None）"""
+    combos = np.array(list(itertools.product(*[range(len(counts)) for counts in curves.counts])))
+    counts = curves._gather(combos.T)
+    dp, eo = disparity_arrays(counts)
+    disparity = dp if constraint == 'demographic_parity' else eo
+    totals = counts.sum(axis=-2)
+    accuracy = (totals[:, TP] + totals[:, TN]) / totals.sum(axis=-1)
+    feasible = disparity <= bound
+    return accuracy[feasible].max() if feasible.any() else None
+
+
+@pytest.mark.parametrize('seed', [0, 2])
+@pytest.mark.parametrize('constraint, tolerance', [('demographic_parity', 0), ('equalized_odds', 0.04)])
+@pytest.mark.parametrize('bound', [0.02, 0.05])
+def test_best_thresholds_respect_bound(seed, constraint, tolerance, bound):
+    y_true, scores, groups = _scored(seed)
+    curves = compute_threshold_curves(y_true, scores, groups)
+
+    result = curves.best_thresholds(constraint, bound)
+
+    # 把选出的分组阈值用回原始数据，差异不超过 bound，准确率与报告一致
+    thresholds = result['by_group']['threshold']
+    y_pred = (scores >= thresholds.reindex(groups).to_numpy()).astype(int)
+    metrics = compute_group_metrics(y_true, y_pred, groups)
+    disparity = (metrics.demographic_parity_difference() if constraint == 'demographic_parity'
+                 else metrics.equalized_odds_difference())
+    assert result['feasible']
+    assert disparity <= bound + 1e-12
+    assert result['accuracy'] == pytest.approx(metrics.overall['accuracy'])
+
+    # 不会超过穷举得到的最优解；DP 的搜索能找到最优解，EO 只按 TPR 搜索，允许少许差距
+    best = _brute_force(curves, constraint, bound)
+    assert best - tolerance - 1e-12 <= result['accuracy'] <= best + 1e-12
+
+
+def test_best_thresholds_reports_infeasible_bound():
+    y_true, scores, groups = _scored(0)
+    curves = compute_threshold_curves(y_true, scores, groups)
+
+    result = curves.best_thresholds('demographic_parity', bound=-1)
+
+    assert _brute_force(curves, 'demographic_parity', -1) is None
+    assert not result['feasible']
+
+
+def test_best_thresholds_rejects_unknown_constraint():
+    y_true, scores, groups = _scored(0, n=50)
+    with pytest.raises(ValueError):
+        compute_threshold_curves(y_true, scores, groups).best_thresholds('equal_opportunity')
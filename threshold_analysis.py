@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from bootstrap_ci import disparity_arrays
+from group_metrics import TN, FP, FN, TP, factorize_sensitive, rates_from_counts, restore_labels
+
+FAIRNESS_CONSTRAINTS = ('demographic_parity', 'equalized_odds')
+
+
+def _curve_counts(y_true, y_score):
+    """一个分组的得分只排序一次，累加和得到每个不同阈值下的 TN/FP/FN/TP
+
+    阈值取该组出现过的每个得分（得分 >= 阈值判为正类），第一行为 +inf（全部判为负类）；
+    返回 (thresholds 降序, counts 形状为 (n_thresholds, 4))。
+    """
+    order = np.argsort(-y_score, kind='mergesort')
+    scores = y_score[order]
+    positive = y_true[order]
+    tp = np.cumsum(positive, dtype=np.int64)
+    fp = np.arange(1, len(scores) + 1, dtype=np.int64) - tp
+    # 得分相同的行必须同时判为正类，只保留每段相同得分的最后一行
+    last = np.append(scores[1:] != scores[:-1], True) if len(scores) else np.zeros(0, dtype=bool)
+    tp = np.concatenate([[0], tp[last]])
+    fp = np.concatenate([[0], fp[last]])
+    n_pos, n_neg = tp[-1], fp[-1]
+
+    counts = np.empty((len(tp), 4), dtype=np.int64)
+    counts[:, TN] = n_neg - fp
+    counts[:, FP] = fp
+    counts[:, FN] = n_pos - tp
+    counts[:, TP] = tp
+    return np.concatenate([[np.inf], scores[last]]), counts
+
+
+class ThresholdCurves:
+    """各分组在所有阈值下的计数；ROC 曲线、统一阈值扫描与分组阈值搜索都只查表，不再重新计算指标"""
+
+    def __init__(self, thresholds, counts, labels):
+        self.thresholds = thresholds  # 每组一个降序阈值数组
+        self.counts = counts  # 每组一个 (n_thresholds, 4) 计数数组
+        self.labels = labels
+
+    def relabel(self, category_mappings):
+        return ThresholdCurves(self.thresholds, self.counts, restore_labels(self.labels, category_mappings))
+
+    def roc_curves(self):
+        """{分组: DataFrame(threshold, selection_rate, tpr, fpr, accuracy)}"""
+        curves = {}
+        for label, thresholds, counts in zip(self.labels, self.thresholds, self.counts):
+            rates = rates_from_counts(counts)
+            curves[label] = pd.DataFrame({
+                'threshold': thresholds,
+                'selection_rate': rates['selection_rate'],
+                'tpr': rates['recall'],
+                'fpr': rates['false_positive_rate'],
+                'accuracy': rates['accuracy'],
+            })
+        return curves
+
+    def auc(self):
+        """各分组的 ROC 曲线下面积（梯形法，与 sklearn roc_auc_score 一致）"""
+        values = []
+        for counts in self.counts:
+            rates = rates_from_counts(counts)
+            values.append(float(np.trapz(rates['recall'], rates['false_positive_rate'])))
+        return pd.Series(values, index=self.labels, name='auc')
+
+    def _gather(self, positions):
+        """positions[g] 为第 g 组选中的曲线位置（形状相同），返回形状为 (..., n_groups, 4) 的计数"""
+        return np.stack([counts[pos] for counts, pos in zip(self.counts, positions)], axis=-2)
+
+    def at(self, thresholds):
+        """所有分组使用同一阈值时的整体准确率、选择率与 DP / EO 差异，每个阈值一行"""
+        thresholds = np.asarray(thresholds, dtype=float)
+        # 曲线阈值降序排列：取最后一个 >= t 的位置，即得分 >= t 判为正类
+        positions = [np.searchsorted(-curve, -thresholds, side='right') - 1 for curve in self.thresholds]
+        counts = self._gather(positions)
+        dp, eo = disparity_arrays(counts)
+        overall = rates_from_counts(counts.sum(axis=-2))
+        return pd.DataFrame({
+            'accuracy': overall['accuracy'],
+            'selection_rate': overall['selection_rate'],
+            'demographic_parity_diff': dp,
+            'equalized_odds_diff': eo,
+        }, index=pd.Index(thresholds, name='threshold'))
+
+    def best_thresholds(self, constraint='demographic_parity', bound=0.05, n_targets=1001):
+        """搜索分组阈值：在差异不超过 bound 的组合中取整体准确率最高者
+
+        对 n_targets 个目标比率 t（DP 为选择率，EO 为 TPR）同时求解，每个目标产生两个候选组合：
+        每组取比率最接近 t 的阈值；每组在比率落在 [t, t + bound] 的阈值中取本组准确率最高者。
+        由计数得到各组合的差异与准确率；没有组合满足约束时返回差异最小的组合（feasible=False）。
+        """
+        if constraint not in FAIRNESS_CONSTRAINTS:
+            raise ValueError(f"不支持的公平性约束: {constraint}，可选: {', '.join(FAIRNESS_CONSTRAINTS)}")
+        rate_name = 'selection_rate' if constraint == 'demographic_parity' else 'recall'
+        targets = np.linspace(0, 1, n_targets)
+
+        positions = []
+        for counts in self.counts:
+            # 阈值降低时比率单调不减，可直接二分查找
+            rate = rates_from_counts(counts)[rate_name]
+            right = np.clip(np.searchsorted(rate, targets), 0, len(rate) - 1)
+            left = np.maximum(right - 1, 0)
+            closest = np.where(np.abs(rate[left] - targets) <= np.abs(rate[right] - targets), left, right)
+
+            # 区间内按本组正确数取最大：编码为 正确数 * K + 位置，reduceat 一次求出所有区间的最大值
+            lo = np.searchsorted(rate, targets, side='left')
+            hi = np.searchsorted(rate, targets + bound, side='right')
+            correct = counts[:, TP] + counts[:, TN]
+            keys = np.append(correct * len(rate) + np.arange(len(rate)), -1)
+            band_max = np.maximum.reduceat(keys, np.column_stack([lo, hi]).ravel())[::2]
+            band = np.where(hi > lo, band_max % len(rate), closest)
+            positions.append(np.concatenate([closest, band]))
+
+        counts = self._gather(positions)
+        dp, eo = disparity_arrays(counts)
+        disparity = dp if constraint == 'demographic_parity' else eo
+        accuracy = rates_from_counts(counts.sum(axis=-2))['accuracy']
+        feasible = disparity <= bound
+        if feasible.any():
+            best = int(np.argmax(np.where(feasible, accuracy, -np.inf)))
+        else:
+            best = int(np.argmin(disparity))
+
+        group_counts = counts[best]
+        rates = rates_from_counts(group_counts)
+        by_group = pd.DataFrame({
+            'threshold': [curve[pos[best]] for curve, pos in zip(self.thresholds, positions)],
+            'selection_rate': rates['selection_rate'],
+            'tpr': rates['recall'],
+            'fpr': rates['false_positive_rate'],
+            'accuracy': rates['accuracy'],
+        }, index=self.labels)
+        return {
+            'constraint': constraint,
+            'bound': bound,
+            'feasible': bool(feasible[best]),
+            'by_group': by_group,
+            'accuracy': float(accuracy[best]),
+            'demographic_parity_diff': float(dp[best]),
+            'equalized_odds_diff': float(eo[best]),
+        }
+
+
+def compute_threshold_curves(y_true, y_score, sensitive_features, pos_label=1):
+    """按分组计算所有阈值下的计数：整体按分组排序一次，再在每组内按得分排序一次"""
+    codes, labels = factorize_sensitive(sensitive_features)
+    y_true = np.asarray(y_true) == pos_label
+    y_score = np.asarray(y_score, dtype=float)
+
+    order = np.argsort(codes, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(labels)))])
+    thresholds, counts = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        rows = order[start:end]
+        group_thresholds, group_counts = _curve_counts(y_true[rows], y_score[rows])
+        thresholds.append(group_thresholds)
+        counts.append(group_counts)
+    return ThresholdCurves(thresholds, counts, labels)
@@ -0,0 +1,127 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from flask import Request
+
+# 单个请求体的大小上限；超过时在读取请求体之前返回 413
+MAX_UPLOAD_BYTES = int(float(os.environ.get('FAIRNESS_MAX_UPLOAD_MB', 2048)) * 1024 * 1024)
+# 小于该大小的上传留在内存中，更大的写入磁盘上的临时文件
+SPOOL_MAX_BYTES = int(float(os.environ.get('FAIRNESS_SPOOL_MB', 8)) * 1024 * 1024)
+UPLOAD_DIR = os.environ.get('FAIRNESS_UPLOAD_DIR') or None
+
+
+class HashingSpool(io.RawIOBase):
+    """上传内容边到达边写入：同时计算 sha256，超过 spool_bytes 后转存到磁盘上的命名临时文件
+
+    转存后 path 为临时文件路径，解析时可直接按路径读取（parquet / feather 内存映射），不必再读一遍上传流。
+    """
+
+    def __init__(self, spool_bytes=SPOOL_MAX_BYTES, dir=UPLOAD_DIR):
+        super().__init__()
+        self.spool_bytes = spool_bytes
+        self.dir = dir
+        self._file = io.BytesIO()
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self.path = None
+
+    def _rollover(self):
+        disk_file = tempfile.NamedTemporaryFile(prefix='upload-', dir=self.dir)
+        disk_file.write(self._file.getbuffer())
+        self._file = disk_file
+        self.path = disk_file.name
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        self._digest.update(data)
+        self._size += len(data)
+        if self.path is None and self._size > self.spool_bytes:
+            self._rollover()
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self.closed:
+            # NamedTemporaryFile 关闭时删除磁盘文件
+            self._file.close()
+        super().close()
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    @property
+    def size(self):
+        return self._size
+
+
+class UploadRequest(Request):
+    """上传的文件写入 HashingSpool；请求体大小由 app.config['MAX_CONTENT_LENGTH'] 限制"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool()
+
+
+def configure_uploads(app, max_upload_bytes=MAX_UPLOAD_BYTES):
+    """为 Flask 应用启用落盘上传与大小限制（Content-Length 超限时直接返回 413，不读取请求体）"""
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = max_upload_bytes
+    return app
+
+
+def upload_hash(upload):
+    """上传内容的 sha256：写入时已算好则直接取，否则读一遍流"""
+    stream = upload.stream
+    if isinstance(stream, HashingSpool):
+        return stream.hexdigest()
+    from result_cache import hash_stream
+    return hash_stream(stream)
+
+
+def upload_source(upload):
+    """解析用的数据源：已落盘时返回临时文件路径（可内存映射），否则返回上传流本身"""
+    stream = upload.stream
+    if isinstance(stream, HashingSpool) and stream.path is not None:
+        stream.flush()
+        return stream.path
+    return upload
+
+
+def save_upload(upload, path):
+    """保存上传文件：已落盘时优先建立硬链接，不再复制内容"""
+    stream = upload.stream
+    if isinstance(stream, HashingSpool) and stream.path is not None:
+        stream.flush()
+        try:
+            os.link(stream.path, path)
+            return
+        except OSError:
+            # 跨文件系统等情况下退回复制
+            pass
+    stream.seek(0)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(stream, f)
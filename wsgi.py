@@ -0,0 +1,14 @@
+import importlib.util
+import os
+
+from interactive2 import warm_imports
+
+# app1.1.py 的文件名含有 "."，不能直接 import，按文件路径加载后导出给 gunicorn
+_spec = importlib.util.spec_from_file_location('app1_1', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app1.1.py'))
+_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_module)
+app = _module.app
+
+# 配合 gunicorn 的 preload_app：重模块在 master 中导入一次，fork 后各 worker 共享，不再各自冷启动
+if os.environ.get('FAIRNESS_WARM_IMPORTS', '1') == '1':
+    warm_imports()